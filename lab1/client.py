@@ -1,29 +1,110 @@
+import json
+import random
 import socket
 import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse
 import os
 
+# The body is moved through one buffer of this size, whatever the file size
+BUFFER_SIZE = 64 * 1024
+# Largest response head we accept before giving up on the server
+MAX_HEAD_BYTES = 64 * 1024
+# Bodies shown on the terminal are cut at this many characters
+PREVIEW_CHARS = 1000
+# Segmented downloads record their progress in <output>.segments
+SIDECAR_SUFFIX = ".segments"
+# How often the progress of running segments is written to the sidecar
+SIDECAR_SAVE_INTERVAL = 1.0
+# Attempts per segment before the download gives up (it can still be resumed)
+SEGMENT_ATTEMPTS = 3
+# 429 and 503 answers are waited out this many times per request, backing
+# off from THROTTLE_BACKOFF seconds unless the server sends Retry-After
+THROTTLE_RETRIES = 8
+THROTTLE_BACKOFF = 0.5
+THROTTLE_MAX_WAIT = 30.0
+# Segment connections are opened this far apart rather than all at once,
+# so a per-client rate limit is not hit by the first burst
+SEGMENT_STAGGER = 0.1
+
+
+class _BodyReader:
+    """Reads a response body from the socket.
+
+    Body bytes that arrived together with the headers are handed out first,
+    then ``readinto`` reads straight from the socket into the caller's
+    buffer, so nothing grows with the size of the body.
+    """
+
+    def __init__(self, sock, leftover: bytes):
+        self.sock = sock
+        self.pending = bytearray(leftover)
+
+    def readinto(self, view: memoryview) -> int:
+        if self.pending:
+            n = min(len(view), len(self.pending))
+            view[:n] = self.pending[:n]
+            del self.pending[:n]
+            return n
+        return self.sock.recv_into(view)
+
+    def readline(self) -> bytes:
+        # Only used for chunk-size lines, which are a few bytes long
+        while True:
+            end = self.pending.find(b"\r\n")
+            if end >= 0:
+                line = bytes(self.pending[:end])
+                del self.pending[:end + 2]
+                return line
+            if len(self.pending) > 1024:
+                raise ValueError("Malformed chunked encoding")
+            data = self.sock.recv(BUFFER_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed in the middle of the body")
+            self.pending += data
+
+
+class _Progress:
+    def __init__(self, total, enabled, done=0):
+        self.total = total
+        self.enabled = enabled
+        self.done = done
+        # Bytes that were already on disk do not count towards the rate
+        self.resumed = done
+        self.started = time.monotonic()
+        self.shown_at = 0.0
+
+    def update(self, n, final=False):
+        self.done += n
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        # Redrawn at most five times a second so the terminal is not the bottleneck
+        if not final and now - self.shown_at < 0.2:
+            return
+        self.shown_at = now
+        rate = (self.done - self.resumed) / max(now - self.started, 1e-6)
+        line = f"  {self.done / 1048576:.1f} MiB"
+        if self.total:
+            line += f" / {self.total / 1048576:.1f} MiB ({self.done * 100 // self.total}%)"
+        line += f"  {rate / 1048576:.1f} MiB/s"
+        print(line, end="\n" if final else "\r", flush=True)
+
 
 class HTTPClient:
     def __init__(self):
         self.socket = None
 
-    def fetch(self, url, output_file=None):
-        """Fetch a resource from the given URL"""
-        # Parse URL
-        parsed = urlparse(url)
-
-        # Default values
-        scheme = parsed.scheme or "http"
-        host = parsed.hostname
-        port = parsed.port or 80
-        path = parsed.path or "/"
-
-        if not host:
-            raise ValueError("Invalid URL: no host specified")
+    def fetch(self, url, output_file=None, progress=False):
+        """Fetch a resource from the given URL.
 
-        if scheme != "http":
-            raise ValueError("Only HTTP protocol is supported")
+        With ``output_file`` the body is streamed to disk as it arrives and
+        memory use stays flat whatever its size; otherwise it is returned and
+        shown. ``progress`` prints the bytes received so far.
+        """
+        host, port, path = self._parse_url(url)
 
         print(f"Connecting to {host}:{port}")
 
@@ -40,110 +121,424 @@ class HTTPClient:
 
         print(f"Sending request:\n{request}")
 
-        # Send request
-        self.socket.sendall(request.encode("utf-8"))
-
-        # Receive response
-        response_data = b""
-        while True:
-            chunk = self.socket.recv(4096)
-            if not chunk:
-                break
-            response_data += chunk
-
-        self.socket.close()
-
-        # Parse response
-        response_str = response_data.decode("utf-8", errors="ignore")
-
-        # Split headers and body
-        if "\r\n\r\n" in response_str:
-            headers_part, body_part = response_str.split("\r\n\r\n", 1)
-        else:
-            headers_part = response_str
-            body_part = ""
-
-        # Parse status line
-        lines = headers_part.split("\r\n")
-        status_line = lines[0]
-
-        print(f"\nResponse status: {status_line}")
-        print(f"\nHeaders:")
-        for line in lines[1:]:
-            if line:
-                print(f"  {line}")
-
-        # Extract status code
-        status_parts = status_line.split()
-        status_code = int(status_parts[1]) if len(status_parts) > 1 else 0
+        try:
+            # Send request
+            self.socket.sendall(request.encode("utf-8"))
+
+            headers_part, leftover = self._read_head(self.socket)
+            lines = headers_part.split("\r\n")
+            status_line = lines[0]
+
+            print(f"\nResponse status: {status_line}")
+            print(f"\nHeaders:")
+            headers = {}
+            for line in lines[1:]:
+                if line:
+                    print(f"  {line}")
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+            # Extract status code
+            status_parts = status_line.split()
+            status_code = int(status_parts[1]) if len(status_parts) > 1 else 0
+            print(f"\nStatus code: {status_code}")
+
+            reader = _BodyReader(self.socket, leftover)
+            if output_file:
+                output_file = self._output_path(output_file, path)
+                length = self._save_body(reader, headers, output_file, progress)
+                print(f"Body length: {length} bytes")
+                print(f"\nSaved to: {output_file}")
+                return status_code, headers_part, ""
 
-        print(f"\nStatus code: {status_code}")
-        print(f"Body length: {len(body_part)} bytes")
-        import os
-
-        # Сохраняем тело в файл
-        if output_file:
-            # Если передан путь к папке, добавляем имя файла из URL
-            if os.path.isdir(output_file):
-                filename = os.path.basename(path)
-                if not filename:
-                    filename = "output.bin"  # имя по умолчанию
-                output_file = os.path.join(output_file, filename)
-
-            # Получаем тело из сырых байт
-            body_start = response_data.find(b"\r\n\r\n") + 4
-            body_bytes = response_data[body_start:]
-
-            # Создаём папки если их нет
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-            with open(output_file, "wb") as f:
-                f.write(body_bytes)
-            print(f"\nSaved to: {output_file}")
-
-        # Save or display body
-        if output_file:
-            # For binary files, we need to get the body from raw response_data
-            body_start = response_data.find(b"\r\n\r\n") + 4
-            body_bytes = response_data[body_start:]
-
-            with open(output_file, "wb") as f:
-                f.write(body_bytes)
-            print(f"\nSaved to: {output_file}")
-        else:
             # Display body (for text content)
+            body = bytearray()
+            self._copy_body(reader, headers, body.extend, _Progress(None, progress))
+            body_part = body.decode("utf-8", errors="ignore")
+            print(f"Body length: {len(body)} bytes")
             print(f"\nBody:\n{'-' * 60}")
-            if len(body_part) > 1000:
-                print(body_part[:1000])
+            if len(body_part) > PREVIEW_CHARS:
+                print(body_part[:PREVIEW_CHARS])
                 print(
-                    f"\n... (truncated, showing first 1000 chars of {len(body_part)})"
+                    f"\n... (truncated, showing first {PREVIEW_CHARS} chars of {len(body_part)})"
                 )
             else:
                 print(body_part)
             print("-" * 60)
+            return status_code, headers_part, body_part
+        finally:
+            self.socket.close()
+
+    def _parse_url(self, url):
+        parsed = urlparse(url)
+
+        # Default values
+        scheme = parsed.scheme or "http"
+        host = parsed.hostname
+        port = parsed.port or 80
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        if not host:
+            raise ValueError("Invalid URL: no host specified")
+
+        if scheme != "http":
+            raise ValueError("Only HTTP protocol is supported")
+        return host, port, path
+
+    def _read_head(self, sock):
+        """Receive until the blank line that ends the headers.
 
-        return status_code, headers_part, body_part
+        Returns the decoded head and whatever body bytes came with it.
+        """
+        data = bytearray()
+        while True:
+            # Only the new bytes (and 3 before them) can complete the terminator
+            start = max(0, len(data) - 3)
+            chunk = sock.recv(BUFFER_SIZE)
+            if not chunk:
+                raise ConnectionError("Connection closed before the response headers")
+            data += chunk
+            end = data.find(b"\r\n\r\n", start)
+            if end >= 0:
+                return data[:end].decode("iso-8859-1"), bytes(data[end + 4:])
+            if len(data) > MAX_HEAD_BYTES:
+                raise ValueError("Response headers too large")
+
+    def _output_path(self, output_file, path):
+        # A directory (existing, or to be created when given with a trailing
+        # slash) gets the file name from the URL
+        if os.path.isdir(output_file) or output_file.endswith(("/", os.sep)):
+            filename = os.path.basename(path.split("?")[0])
+            if not filename:
+                filename = "output.bin"  # default name
+            output_file = os.path.join(output_file, filename)
+        # Create missing directories
+        directory = os.path.dirname(output_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return output_file
+
+    def _save_body(self, reader, headers, output_file, progress):
+        # Written to a .part file first, so an interrupted download never
+        # leaves something that looks like the complete file.
+        partial = output_file + ".part"
+        total = int(headers["content-length"]) if "content-length" in headers else None
+        try:
+            with open(partial, "wb") as f:
+                length = self._copy_body(reader, headers, f.write, _Progress(total, progress))
+            os.replace(partial, output_file)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return length
+
+    def _copy_body(self, reader, headers, write, progress):
+        """Pass the body to ``write`` one buffer at a time; returns its length.
+
+        Honors chunked transfer coding and Content-Length, and otherwise
+        reads until the server closes the connection.
+        """
+        buffer = memoryview(bytearray(BUFFER_SIZE))
+
+        def copy(remaining):
+            # remaining=None copies until the connection closes
+            copied = 0
+            while remaining is None or copied < remaining:
+                want = BUFFER_SIZE if remaining is None else min(BUFFER_SIZE, remaining - copied)
+                n = reader.readinto(buffer[:want])
+                if not n:
+                    if remaining is None:
+                        break
+                    raise ConnectionError(f"Connection closed after {progress.done} body bytes")
+                write(buffer[:n])
+                copied += n
+                progress.update(n)
+            return copied
+
+        length = 0
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            while True:
+                size = int(reader.readline().split(b";")[0], 16)
+                if size == 0:
+                    break
+                length += copy(size)
+                reader.readline()  # CRLF after the chunk data
+            # Trailer fields, if any, end with an empty line
+            while reader.readline():
+                pass
+        elif "content-length" in headers:
+            length = copy(int(headers["content-length"]))
+        else:
+            length = copy(None)
+        progress.update(0, final=True)
+        return length
+
+
+    def download(self, url, output_file, segments=4, progress=False):
+        """Download over ``segments`` parallel connections, resuming if possible.
+
+        The size is probed with a one-byte range request. The file is then
+        split into byte ranges that are fetched concurrently and written
+        with pwrite straight into a preallocated ``.part`` file. How far each
+        range got is kept in a ``.segments`` sidecar file. Running the same
+        download again after an interruption fetches only what is missing.
+        If-Range makes sure the pieces all come from the same version of
+        the file. Servers without range support get a plain fetch().
+        """
+        host, port, path = self._parse_url(url)
+        output_file = self._output_path(output_file, path)
+        print(f"Connecting to {host}:{port}")
+        size, validator = self._probe(host, port, path)
+        if size is None:
+            print("Server does not support byte ranges, downloading over one connection")
+            return self.fetch(url, output_file, progress)
+
+        partial = output_file + ".part"
+        sidecar = output_file + SIDECAR_SUFFIX
+        state = self._load_sidecar(sidecar, url, size, validator)
+        if state is None or not os.path.exists(partial):
+            step = -(-size // max(1, segments))
+            state = {
+                "url": url,
+                "size": size,
+                "validator": validator,
+                # [first byte, last byte, next byte to fetch] per segment
+                "segments": [[start, min(start + step, size) - 1, start] for start in range(0, size, step)],
+            }
+            with open(partial, "wb") as f:
+                # Reserve the space up front: no fragmentation, and a full
+                # disk fails now instead of halfway through
+                if size and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(f.fileno(), 0, size)
+                else:
+                    f.truncate(size)
+            self._save_sidecar(sidecar, state)
+        pending = [segment for segment in state["segments"] if segment[2] <= segment[1]]
+        fetched = size - sum(segment[1] - segment[2] + 1 for segment in pending)
+        if fetched:
+            print(f"Resuming: {fetched} of {size} bytes already downloaded")
+        print(f"Downloading {size - fetched} bytes in {len(pending)} segments")
+
+        fd = os.open(partial, os.O_WRONLY)
+        lock = threading.Lock()
+        meter = _Progress(size, progress, fetched)
+        saved_at = [time.monotonic()]
+        errors = []
+
+        def advanced(n):
+            with lock:
+                meter.update(n)
+                if time.monotonic() - saved_at[0] >= SIDECAR_SAVE_INTERVAL:
+                    self._checkpoint(fd, sidecar, state)
+                    saved_at[0] = time.monotonic()
+
+        def run(segment):
+            try:
+                self._fetch_segment(host, port, path, fd, segment, validator, advanced)
+            except Exception as e:
+                errors.append(e)
+            with lock:
+                self._checkpoint(fd, sidecar, state)
+
+        threads = [threading.Thread(target=run, args=(segment,), daemon=True) for segment in pending]
+        try:
+            for i, thread in enumerate(threads):
+                if i:
+                    time.sleep(SEGMENT_STAGGER)
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            # Also on Ctrl+C: what was written so far is kept for the next run
+            with lock:
+                self._checkpoint(fd, sidecar, state)
+            os.close(fd)
+
+        if errors:
+            raise errors[0]
+        meter.update(0, final=True)
+        os.replace(partial, output_file)
+        os.remove(sidecar)
+        print(f"\nSaved to: {output_file}")
+        return size
+
+    def _probe(self, host, port, path):
+        """Returns (size, validator), or (None, None) without range support."""
+        throttled = 0
+        while True:
+            sock = socket.create_connection((host, port), timeout=30)
+            try:
+                request = f"GET {path} HTTP/1.1\r\n"
+                request += f"Host: {host}\r\n"
+                request += "User-Agent: Python-HTTP-Client/1.0\r\n"
+                request += "Range: bytes=0-0\r\n"
+                request += "Connection: close\r\n"
+                request += "\r\n"
+                sock.sendall(request.encode("utf-8"))
+                status_code, headers = self._parse_head(self._read_head(sock)[0])
+            finally:
+                sock.close()
+            throttled += 1
+            delay = self._throttle_delay(status_code, headers, throttled)
+            if delay is None:
+                break
+            print(f"Server answered {status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        if status_code != 206:
+            return None, None
+        # Content-Range: bytes 0-0/<size>
+        total = headers.get("content-range", "").rpartition("/")[2]
+        if not total.isdigit():
+            return None, None
+        # If-Range needs a strong ETag; a date is the fallback
+        etag = headers.get("etag", "")
+        validator = etag if etag and not etag.startswith("W/") else headers.get("last-modified")
+        return int(total), validator
+
+    def _fetch_segment(self, host, port, path, fd, segment, validator, advanced):
+        buffer = memoryview(bytearray(BUFFER_SIZE))
+        attempt = throttled = 0
+        while True:
+            sock = None
+            delay = None
+            try:
+                sock = socket.create_connection((host, port), timeout=30)
+                # Asks only for what is still missing, so a retry continues
+                request = f"GET {path} HTTP/1.1\r\n"
+                request += f"Host: {host}\r\n"
+                request += "User-Agent: Python-HTTP-Client/1.0\r\n"
+                request += f"Range: bytes={segment[2]}-{segment[1]}\r\n"
+                if validator:
+                    request += f"If-Range: {validator}\r\n"
+                request += "Connection: close\r\n"
+                request += "\r\n"
+                sock.sendall(request.encode("utf-8"))
+                head, leftover = self._read_head(sock)
+                status_code, headers = self._parse_head(head)
+                throttled += 1
+                delay = self._throttle_delay(status_code, headers, throttled)
+                if delay is not None:
+                    print(f"\nSegment {segment[0]}-{segment[1]}: server answered {status_code}, retrying in {delay:.1f}s")
+                    continue
+                if status_code != 206:
+                    # 200 means If-Range failed: the file changed on the server
+                    raise ValueError(f"Expected 206 for bytes {segment[2]}-{segment[1]}, got {status_code}")
+                reader = _BodyReader(sock, leftover)
+                while segment[2] <= segment[1]:
+                    n = reader.readinto(buffer[:min(BUFFER_SIZE, segment[1] - segment[2] + 1)])
+                    if not n:
+                        raise ConnectionError(f"Connection closed at byte {segment[2]}")
+                    written = 0
+                    while written < n:
+                        written += os.pwrite(fd, buffer[written:n], segment[2] + written)
+                    # Only bytes that are written count as fetched
+                    segment[2] += n
+                    advanced(n)
+                return
+            except (ConnectionError, socket.timeout) as e:
+                attempt += 1
+                if attempt == SEGMENT_ATTEMPTS:
+                    raise
+                print(f"\nSegment {segment[0]}-{segment[1]}: {e}, retrying")
+            finally:
+                if sock is not None:
+                    sock.close()
+                # Waited out after the connection is closed, not while holding it
+                if delay is not None:
+                    time.sleep(delay)
+
+    def _throttle_delay(self, status_code, headers, tries):
+        """Seconds to wait before retrying a 429/503, or None to not retry."""
+        if status_code not in (429, 503) or tries > THROTTLE_RETRIES:
+            return None
+        retry_after = headers.get("retry-after", "")
+        if retry_after.isascii() and retry_after.isdigit():
+            return min(float(retry_after), THROTTLE_MAX_WAIT)
+        if retry_after:
+            try:
+                wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(wait, 0.0), THROTTLE_MAX_WAIT)
+            except (TypeError, ValueError):
+                pass
+        # Exponential with jitter, so segments throttled together do not
+        # all come back in the same instant
+        backoff = min(THROTTLE_BACKOFF * 2 ** (tries - 1), THROTTLE_MAX_WAIT)
+        return random.uniform(backoff / 2, backoff)
+
+    def _parse_head(self, headers_part):
+        lines = headers_part.split("\r\n")
+        status_parts = lines[0].split()
+        status_code = int(status_parts[1]) if len(status_parts) > 1 else 0
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status_code, headers
+
+    def _load_sidecar(self, sidecar, url, size, validator):
+        try:
+            with open(sidecar) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Progress only counts for the same resource in the same version
+        if (state.get("url"), state.get("size"), state.get("validator")) != (url, size, validator):
+            print("Server file changed since the last attempt, starting over")
+            return None
+        return state
+
+    def _checkpoint(self, fd, sidecar, state):
+        # Positions are taken before the fsync, so the sidecar never claims
+        # bytes that might not have reached the disk
+        snapshot = dict(state, segments=[list(segment) for segment in state["segments"]])
+        os.fsync(fd)
+        self._save_sidecar(sidecar, snapshot)
+
+    def _save_sidecar(self, sidecar, state):
+        tmp = sidecar + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, sidecar)
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python client.py <URL> [output_file_path]")
+    args = []
+    progress = False
+    segments = 0
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == "--progress":
+            progress = True
+        elif arg == "--segments":
+            segments = int(next(argv, "4"))
+        else:
+            args.append(arg)
+    if len(args) < 1 or (segments and len(args) < 2):
+        print("Usage: python client.py <URL> [output_file_path] [--progress] [--segments N]")
         print("\nExamples:")
         print("  python client.py http://localhost:8080/")
         print("  python client.py http://localhost:8080/test.txt")
         print(
             "  python client.py http://localhost:8080/image.png /home/user/output/image.png"
         )
+        print("  python client.py http://localhost:8080/main.pdf ./downloads --progress")
+        print("  python client.py http://localhost:8080/big.iso ./downloads --segments 8")
         print("\nTask 4: Browse friend's server:")
         print("  python client.py http://192.168.1.100:8080/")
         sys.exit(1)
 
-    url = sys.argv[1]
-    output_file_path = sys.argv[2] if len(sys.argv) > 2 else None
+    url = args[0]
+    output_file_path = args[1] if len(args) > 1 else None
 
     try:
         client = HTTPClient()
-        client.fetch(url, output_file_path)
+        if segments:
+            client.download(url, output_file_path, segments, progress)
+        else:
+            client.fetch(url, output_file_path, progress)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -2,17 +2,33 @@ import socket
 import os
 import sys
 import mimetypes
+import select
+from collections import deque
 from pathlib import Path
-from urllib.parse import unquote
+
+from http_parser import RequestParser
 
 
 class HTTPServer:
-    def __init__(self, directory, host="0.0.0.0", port=8080, auto_port=True):
+    def __init__(
+        self,
+        directory,
+        host="0.0.0.0",
+        port=8080,
+        auto_port=True,
+        keepalive_timeout=2.0,
+        max_keepalive_requests=100,
+    ):
         self.directory = os.path.abspath(directory)
         self.host = host
         self.port = port
         self.auto_port = auto_port
         self.socket = None
+        # This server handles one connection at a time, so the idle timeout
+        # is kept short, and a connection is given up as soon as another
+        # client is waiting to be accepted.
+        self.keepalive_timeout = keepalive_timeout
+        self.max_keepalive_requests = max_keepalive_requests
 
         if not os.path.isdir(self.directory):
             raise ValueError(f"Directory '{directory}' does not exist")
@@ -85,91 +101,143 @@ class HTTPServer:
             print("✓ Server stopped")
 
     def handle_request(self, client_socket):
-        """Handle HTTP request"""
+        """Handle the HTTP requests of one (possibly persistent) connection"""
+        request = None
         try:
-
-            request = client_socket.recv(4096).decode("utf-8")
-
-            if not request:
-                return
-
-            lines = request.split("\r\n")
-            request_line = lines[0]
-            print(f"Request: {request_line}")
-
-            # Parse method, path, and version
-            parts = request_line.split()
-            if len(parts) < 2:
-                self.send_response(client_socket, 400, "Bad Request", "text/html")
-                return
-
-            method = parts[0]
-            path = unquote(parts[1])  # Decode URL encoding
-
-            if method != "GET":
-                self.send_response(
-                    client_socket, 405, "Method Not Allowed", "text/html"
-                )
-                return
-
-            if path.startswith("/"):
-                path = path[1:]
-
-            full_path = os.path.normpath(os.path.join(self.directory, path))
-            if not full_path.startswith(self.directory):
-                self.send_response(client_socket, 403, "Forbidden", "text/html")
-                return
-
-            if not path or path == "":
-                full_path = self.directory
-
-            # Check if path exists
-            if not os.path.exists(full_path):
-                self.send_404(client_socket, path)
-                return
-
-            # Handle directories
-            if os.path.isdir(full_path):
-                self.serve_directory(client_socket, full_path, path)
-            else:
-                self.serve_file(client_socket, full_path)
-
+            client_socket.settimeout(self.keepalive_timeout)
+            parser = RequestParser()
+            pending = deque()
+            served = 0
+            while True:
+                if not pending:
+                    if parser.error is not None:
+                        self.send_response(
+                            client_socket,
+                            parser.error.status,
+                            parser.error.reason,
+                            "text/html",
+                        )
+                        return
+                    if parser.closed:
+                        return
+                    # Wait for this client's next request, but not while
+                    # another client queues behind an idle connection
+                    readable, _, _ = select.select(
+                        [client_socket, self.socket], [], [], self.keepalive_timeout
+                    )
+                    if client_socket not in readable:
+                        return
+                    data = client_socket.recv(65536)
+                    if not data:
+                        return
+                    pending.extend(parser.feed(data))
+                    continue
+                request = pending.popleft()
+
+                served += 1
+                if served >= self.max_keepalive_requests or self.client_waiting():
+                    request.keep_alive = False
+
+                self.dispatch(client_socket, request)
+                if not request.keep_alive:
+                    return
+
+        except (socket.timeout, ConnectionError):
+            pass
         except Exception as e:
             print(f"Error handling request: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            self.send_response(
+                client_socket, 500, "Internal Server Error", "text/html", request
+            )
         finally:
             client_socket.close()
 
-    def serve_file(self, client_socket, file_path):
+    def client_waiting(self):
+        """Whether another connection is waiting in the listen backlog"""
+        readable, _, _ = select.select([self.socket], [], [], 0)
+        return bool(readable)
+
+    def dispatch(self, client_socket, request):
+        """Route a single parsed request"""
+        print(f"Request: {request.method} {request.target} {request.version}")
+
+        method = request.method
+        path = request.path  # URL-decoded, query string removed
+
+        if method != "GET":
+            self.send_response(
+                client_socket, 405, "Method Not Allowed", "text/html", request
+            )
+            return
+
+        if path.startswith("/"):
+            path = path[1:]
+
+        full_path = os.path.normpath(os.path.join(self.directory, path))
+        if not full_path.startswith(self.directory):
+            self.send_response(client_socket, 403, "Forbidden", "text/html", request)
+            return
+
+        if not path or path == "":
+            full_path = self.directory
+
+        # Check if path exists
+        if not os.path.exists(full_path):
+            self.send_404(client_socket, path, request)
+            return
+
+        # Handle directories
+        if os.path.isdir(full_path):
+            self.serve_directory(client_socket, full_path, path, request)
+        else:
+            self.serve_file(client_socket, full_path, request)
+
+    def connection_headers(self, request, status_code=200):
+        """Connection headers for a response to the given request"""
+        # After a server error the stream state is unknown: close it
+        if request is not None and status_code >= 500:
+            request.keep_alive = False
+        if request is not None and request.keep_alive:
+            return [
+                "Connection: keep-alive",
+                f"Keep-Alive: timeout={int(self.keepalive_timeout)}, max={self.max_keepalive_requests}",
+            ]
+        return ["Connection: close"]
+
+    def serve_file(self, client_socket, file_path, request=None):
         """Serve a file to the client"""
         try:
-            with open(file_path, "rb") as f:
-                content = f.read()
-
             #  content type
             content_type, _ = mimetypes.guess_type(file_path)
             if content_type is None:
                 content_type = "application/octet-stream"
 
-            # Send response
-            response_headers = [
-                "HTTP/1.1 200 OK",
-                f"Content-Type: {content_type}",
-                f"Content-Length: {len(content)}",
-                "Connection: close",
-                "",
-                "",
-            ]
+            with open(file_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+
+                # Send response
+                response_headers = [
+                    "HTTP/1.1 200 OK",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {size}",
+                    *self.connection_headers(request),
+                    "",
+                    "",
+                ]
 
-            header = "\r\n".join(response_headers).encode("utf-8")
-            client_socket.sendall(header + content)
+                header = "\r\n".join(response_headers).encode("utf-8")
+                client_socket.sendall(header)
+                # Stream the body with sendfile instead of reading it into memory
+                client_socket.sendfile(f, 0, size)
             print(f"✓ Served file: {os.path.basename(file_path)}")
 
         except Exception as e:
             print(f"✗ Error serving file: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            self.send_response(
+                client_socket, 500, "Internal Server Error", "text/html", request
+            )
 
-    def serve_directory(self, client_socket, dir_path, url_path):
+    def serve_directory(self, client_socket, dir_path, url_path, request=None):
         """Serve a directory listing as HTML"""
         try:
             entries = os.listdir(dir_path)
@@ -243,7 +311,7 @@ class HTTPServer:
                 "HTTP/1.1 200 OK",
                 "Content-Type: text/html; charset=utf-8",
                 f"Content-Length: {len(content)}",
-                "Connection: close",
+                *self.connection_headers(request),
                 "",
                 "",
             ]
@@ -254,9 +322,11 @@ class HTTPServer:
 
         except Exception as e:
             print(f"✗ Error serving directory: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            self.send_response(
+                client_socket, 500, "Internal Server Error", "text/html", request
+            )
 
-    def send_404(self, client_socket, path):
+    def send_404(self, client_socket, path, request=None):
         content = f"""<!DOCTYPE html>
 <html>
 <head>
@@ -286,7 +356,7 @@ class HTTPServer:
             "HTTP/1.1 404 Not Found",
             "Content-Type: text/html; charset=utf-8",
             f"Content-Length: {len(content_bytes)}",
-            "Connection: close",
+            *self.connection_headers(request, 404),
             "",
             "",
         ]
@@ -295,7 +365,9 @@ class HTTPServer:
         client_socket.sendall(header + content_bytes)
         print(f"✗ 404 Not Found: {path}")
 
-    def send_response(self, client_socket, status_code, status_text, content_type):
+    def send_response(
+        self, client_socket, status_code, status_text, content_type, request=None
+    ):
         """Send a simple HTTP response"""
         content = f"""<!DOCTYPE html>
 <html>
@@ -312,7 +384,7 @@ class HTTPServer:
             f"HTTP/1.1 {status_code} {status_text}",
             f"Content-Type: {content_type}; charset=utf-8",
             f"Content-Length: {len(content_bytes)}",
-            "Connection: close",
+            *self.connection_headers(request, status_code),
             "",
             "",
         ]
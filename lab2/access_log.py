@@ -0,0 +1,120 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+
+class AccessLog:
+    """Access log written by a background thread.
+
+    Request threads only append a tuple of raw fields to a deque (append and
+    popleft are atomic, so no lock is taken); the writer thread formats
+    records in batches and issues one write per batch. When the queue is
+    full new records are dropped and counted instead of blocking the request.
+
+    ``sample`` is the fraction of successful requests that are logged;
+    responses with status 400 and above are always logged.
+    """
+
+    FORMATS = ("common", "json")
+
+    def __init__(
+        self,
+        stream=None,
+        fmt: str = "common",
+        sample: float = 1.0,
+        max_queue: int = 65536,
+        batch_size: int = 512,
+        flush_interval: float = 0.2,
+    ):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Invalid access log format '{fmt}' (expected one of: {', '.join(self.FORMATS)})")
+        self.stream = stream if stream is not None else sys.stdout
+        self.fmt = fmt
+        self.sample = sample
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: deque = deque()
+        self._writer: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+        # Updated without a lock: approximate under contention, which is
+        # fine for statistics
+        self.logged = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def log(self, ip: str, method: str, target: str, version: str, status: int, size: int, duration: float):
+        if self.sample < 1.0 and status < 400 and random.random() >= self.sample:
+            self.sampled_out += 1
+            return
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append((time.time(), ip, method, target, version, status, size, duration))
+
+    def start(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._stopped.clear()
+        self._writer = threading.Thread(target=self._write_forever, name="access-log-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        # Drains what is queued so the last requests are not lost on shutdown
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join(timeout=2.0)
+            self._writer = None
+        self._write_batch()
+
+    def _write_forever(self):
+        while not self._stopped.is_set():
+            if not self._write_batch():
+                self._stopped.wait(self.flush_interval)
+
+    def _write_batch(self) -> int:
+        queue = self._queue
+        lines = []
+        while queue and len(lines) < self.batch_size:
+            lines.append(self._format(queue.popleft()))
+        if not lines:
+            return 0
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Closed or broken stream: the records are lost, requests are not
+            self.dropped += len(lines)
+            return len(lines)
+        self.logged += len(lines)
+        return len(lines)
+
+    def _format(self, record) -> str:
+        timestamp, ip, method, target, version, status, size, duration = record
+        if self.fmt == "json":
+            return json.dumps({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}Z",
+                "remote_addr": ip,
+                "method": method,
+                "target": target,
+                "version": version,
+                "status": status,
+                "bytes": size,
+                "duration_ms": round(duration * 1000, 3),
+            }) + "\n"
+        # Common Log Format: host ident authuser [date] "request" status bytes
+        date = time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(timestamp))
+        return f'{ip} - - [{date}] "{method} {target} {version}" {status} {size if size else "-"}\n'
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "logged": self.logged,
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+        }
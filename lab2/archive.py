@@ -0,0 +1,87 @@
+import os
+import stat
+import tarfile
+from typing import Iterator, Tuple
+
+BLOCK = tarfile.BLOCKSIZE
+RECORD = tarfile.RECORDSIZE
+
+
+def tar_stream(directory: str, arcname: str, read_size: int = 65536) -> Iterator[bytes]:
+    """Yield a tar archive of ``directory`` piece by piece.
+
+    Nothing is buffered beyond one ``read_size`` block, so a tree of any
+    size is archived in constant memory. Symlinks are stored as links and
+    never followed, so an archive cannot reach outside the served tree.
+    Files are read up to the size recorded in their header: one that grows
+    meanwhile is cut, one that shrinks is padded with zeros.
+    """
+    written = 0
+    for path, name, st in _walk(directory, arcname):
+        info = _tarinfo(path, name, st)
+        if info is None:
+            continue
+        file = None
+        if info.isreg():
+            try:
+                file = open(path, "rb")
+            except OSError:
+                continue
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        yield header
+        written += len(header)
+        if file is None:
+            continue
+        with file:
+            remaining = info.size
+            while remaining > 0:
+                data = file.read(min(read_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+            padding = remaining + (-info.size % BLOCK)
+            if padding:
+                yield b"\0" * padding
+        written += info.size + (-info.size % BLOCK)
+    # End-of-archive marker, then padding to a whole record like tar(1)
+    trailer = 2 * BLOCK
+    trailer += -(written + trailer) % RECORD
+    yield b"\0" * trailer
+
+
+def _walk(path: str, name: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return
+    yield path, name, st
+    if not stat.S_ISDIR(st.st_mode):
+        return
+    try:
+        with os.scandir(path) as it:
+            names = sorted(entry.name for entry in it)
+    except OSError:
+        return
+    for child in names:
+        yield from _walk(os.path.join(path, child), f"{name}/{child}")
+
+
+def _tarinfo(path: str, name: str, st: os.stat_result) -> tarfile.TarInfo | None:
+    info = tarfile.TarInfo(name)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = int(st.st_mtime)
+    if stat.S_ISREG(st.st_mode):
+        info.size = st.st_size
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    elif stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        try:
+            info.linkname = os.readlink(path)
+        except OSError:
+            return None
+    else:
+        # Sockets, FIFOs and devices have no place in a download
+        return None
+    return info
@@ -0,0 +1,231 @@
+"""gzip/deflate response compression for the lab2 server.
+
+Run it directly to precompress a served tree ahead of time; the server then
+sends the ``.gz`` sidecar files as they are instead of compressing:
+
+    python compression.py <directory> [--level 9] [--min-size 256] [--force]
+"""
+import argparse
+import gzip
+import mimetypes
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# Server preference when the client accepts both equally
+ENCODINGS = ("gzip", "deflate")
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+}
+
+
+def is_compressible(content_type: str) -> bool:
+    mime = content_type.partition(";")[0].strip().lower()
+    return mime.startswith("text/") or mime in COMPRESSIBLE_TYPES
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Pick a coding from an Accept-Encoding header; None means identity."""
+    weights: Dict[str, float] = {}
+    wildcard = 0.0
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params[:2].lower() == "q=":
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == "*":
+            wildcard = q
+        elif coding in ENCODINGS:
+            weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    # HTTP "deflate" is the zlib format (RFC 9110, 8.4.1.2), not raw deflate
+    return zlib.compress(data, level)
+
+
+def compress_stream(chunks, encoding: str, level: int = 6):
+    """Compress an iterable of bytes lazily, for bodies that are streamed."""
+    # wbits 31 writes a gzip wrapper (with mtime 0), 15 the zlib one
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def fresh_sidecar(path: str, st: os.stat_result) -> str | None:
+    # A .gz next to the file is used only if it is not older than the file
+    sidecar = path + ".gz"
+    try:
+        sidecar_st = os.stat(sidecar)
+    except OSError:
+        return None
+    return sidecar if sidecar_st.st_mtime_ns >= st.st_mtime_ns else None
+
+
+class Compressor:
+    """Negotiates and produces compressed variants of static files.
+
+    Variants are cached by file identity (inode, size, mtime), so a hot file
+    is compressed once and a changed file is never served stale. A fresh
+    ``.gz`` sidecar is used instead of compressing. Files that do not shrink
+    are remembered too, so they are not compressed again on every hit.
+    """
+
+    def __init__(self, level: int = 6, min_size: int = 256, max_size: int = 8 * 1024 * 1024, cache_bytes: int = 16 * 1024 * 1024):
+        self.level = level
+        self.min_size = min_size
+        self.max_size = max_size
+        self.cache_bytes = cache_bytes
+        self._variants: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int, int], bytes | None]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.compressed = 0
+        self.sidecars = 0
+        self.incompressible = 0
+
+    def variant(self, path: str, st: os.stat_result, encoding: str) -> bytes | None:
+        """Compressed body of a file of at most ``max_size`` bytes, or None
+        when it is not worth sending compressed."""
+        key = (path, encoding)
+        identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None and cached[0] == identity:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Compress outside the lock so other requests are not held up
+        body = None
+        sidecar = fresh_sidecar(path, st) if encoding == "gzip" else None
+        if sidecar is not None:
+            with open(sidecar, "rb") as f:
+                body = f.read()
+            self.sidecars += 1
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) == st.st_size:
+                body = compress(data, encoding, self.level)
+                self.compressed += 1
+        if body is not None and len(body) >= st.st_size * 0.9:
+            body = None
+            self.incompressible += 1
+
+        self._store(key, identity, body)
+        return body
+
+    def has_variant(self, path: str, st: os.stat_result, encoding: str) -> bool:
+        # Whether variant() would answer from the cache, without compressing
+        with self._lock:
+            cached = self._variants.get((path, encoding))
+        return cached is not None and cached[0] == (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _store(self, key, identity, body: bytes | None):
+        size = len(body) if body is not None else 0
+        if size > self.cache_bytes:
+            return
+        with self._lock:
+            old = self._variants.pop(key, None)
+            if old is not None and old[1] is not None:
+                self._bytes -= len(old[1])
+            self._variants[key] = (identity, body)
+            self._bytes += size
+            while self._bytes > self.cache_bytes:
+                _, (_, evicted) = self._variants.popitem(last=False)
+                if evicted is not None:
+                    self._bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "compressed": self.compressed,
+                "sidecars": self.sidecars,
+                "incompressible": self.incompressible,
+                "entries": len(self._variants),
+                "bytes": self._bytes,
+            }
+
+
+def precompress_tree(directory: str, level: int = 9, min_size: int = 256, force: bool = False) -> Tuple[int, int, int]:
+    """Write ``.gz`` sidecars for compressible files; returns (files, bytes in, bytes out)."""
+    files = before = after = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".gz"):
+                continue
+            path = os.path.join(root, name)
+            content_type, _ = mimetypes.guess_type(path)
+            if content_type is None or not is_compressible(content_type):
+                continue
+            st = os.stat(path)
+            if st.st_size < min_size or (not force and fresh_sidecar(path, st)):
+                continue
+            with open(path, "rb") as f:
+                body = compress(f.read(), "gzip", level)
+            if len(body) >= st.st_size * 0.9:
+                continue
+            # Write then rename, so the server never reads a half-written sidecar
+            tmp = path + ".gz.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, path + ".gz")
+            files += 1
+            before += st.st_size
+            after += len(body)
+            print(f"  {os.path.relpath(path, directory)}: {st.st_size} -> {len(body)} bytes")
+    return files, before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress a served tree into .gz sidecar files.")
+    parser.add_argument("directory")
+    parser.add_argument("--level", type=int, default=9, help="gzip level (default: 9)")
+    parser.add_argument("--min-size", type=int, default=256, help="skip smaller files (default: 256)")
+    parser.add_argument("--force", action="store_true", help="rewrite sidecars that are already fresh")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"✗ Error: Directory '{args.directory}' does not exist")
+        sys.exit(1)
+    files, before, after = precompress_tree(args.directory, args.level, args.min_size, args.force)
+    if files:
+        print(f"✓ Precompressed {files} files: {before} -> {after} bytes ({after / before:.0%})")
+    else:
+        print("✓ Nothing to precompress")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# Named concurrent_load.py rather than concurrent.py: a concurrent.py next to
+# the server shadows the standard library package that asyncio imports.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import ssl
+import sys
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+from performance import LatencyHistogram
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# Connections being opened at once; more overflows the server's listen backlog
+CONNECT_BURST = 256
+
+
+class _Target:
+    __slots__ = ("host", "port", "tls", "path", "label")
+
+    def __init__(self, url: str):
+        parsed = urlparse(url if "://" in url else f"http://{url}")
+        self.tls = parsed.scheme == "https"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or (443 if self.tls else 80)
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += "?" + parsed.query
+        self.label = url
+
+
+def _parse_mix(specs: List[str]) -> Tuple[List[_Target], List[float]]:
+    # "URL" or "URL@weight"; weights are relative
+    targets, weights = [], []
+    for spec in specs:
+        url, sep, weight = spec.rpartition("@")
+        if not sep or not weight.replace(".", "", 1).isdigit():
+            url, weight = spec, "1"
+        targets.append(_Target(url))
+        weights.append(float(weight))
+    return targets, weights
+
+
+def _new_stats() -> Dict[str, object]:
+    return {"status": {}, "errors": {}, "bytes": 0, "connects": 0, "latency": LatencyHistogram(), "per_url": {}}
+
+
+def _record(stats: Dict[str, object], label: str, status: int | None, seconds: float, size: int = 0, error: str = ""):
+    per_url = stats["per_url"].get(label)
+    if per_url is None:
+        per_url = stats["per_url"][label] = {"status": {}, "errors": {}, "latency": LatencyHistogram()}
+    if status is None:
+        for bucket in (stats["errors"], per_url["errors"]):
+            bucket[error] = bucket.get(error, 0) + 1
+        return
+    for bucket in (stats["status"], per_url["status"]):
+        bucket[status] = bucket.get(status, 0) + 1
+    stats["latency"].record(seconds)
+    per_url["latency"].record(seconds)
+    stats["bytes"] += size
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, int, bool]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    size = 0
+    reusable = headers.get("connection") != "close"
+    if "chunked" in headers.get("transfer-encoding", ""):
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            chunk = int(line.split(b";")[0], 16)
+            size += await _discard(reader, chunk + 2) - 2
+            if chunk == 0:
+                break
+    elif "content-length" in headers:
+        size = await _discard(reader, int(headers["content-length"]))
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            size += len(data)
+        reusable = False
+    return status, size, reusable
+
+
+async def _discard(reader: asyncio.StreamReader, length: int) -> int:
+    # Bodies are counted, not kept: 10k connections must not buffer 10k files
+    remaining = length
+    while remaining > 0:
+        data = await reader.read(min(remaining, 65536))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", remaining)
+        remaining -= len(data)
+    return length
+
+
+async def _connection(targets, weights, budget: List[int], stats, options, rng: random.Random, gate: asyncio.Semaphore):
+    reader = writer = None
+    current = None
+    tls_context = ssl.create_default_context() if any(t.tls for t in targets) else None
+    # The event loop is single-threaded, so the shared budget needs no lock
+    while budget[0] > 0:
+        budget[0] -= 1
+        target = rng.choices(targets, weights)[0] if len(targets) > 1 else targets[0]
+        started = time.perf_counter()
+        try:
+            address = (target.host, target.port, target.tls)
+            if writer is not None and address != current:
+                writer.close()
+                writer = None
+            if writer is None:
+                async with gate:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(target.host, target.port, ssl=tls_context if target.tls else None),
+                        options["timeout"],
+                    )
+                current = address
+                stats["connects"] += 1
+            connection = "keep-alive" if options["keep_alive"] else "close"
+            writer.write(f"GET {target.path} HTTP/1.1\r\nHost: {target.host}\r\nConnection: {connection}\r\n\r\n".encode("utf-8"))
+            status, size, reusable = await asyncio.wait_for(_read_response(reader), options["timeout"])
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError) as e:
+            _record(stats, target.label, None, 0.0, error=type(e).__name__)
+            if writer is not None:
+                writer.close()
+                writer = None
+            continue
+        _record(stats, target.label, status, time.perf_counter() - started, size)
+        if not (reusable and options["keep_alive"]):
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _drive(specs: List[str], connections: int, requests: int, options: Dict[str, object], seed: int) -> Dict[str, object]:
+    targets, weights = _parse_mix(specs)
+    stats = _new_stats()
+    budget = [requests]
+    gate = asyncio.Semaphore(CONNECT_BURST)
+    rng = random.Random(seed)
+    await asyncio.gather(*(
+        _connection(targets, weights, budget, stats, options, rng, gate)
+        for _ in range(min(connections, requests))
+    ))
+    return stats
+
+
+def _raise_fd_limit(needed: int):
+    # Every connection is a descriptor; the default soft limit is often 1024
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = needed + 64 if hard == resource.RLIM_INFINITY else min(hard, needed + 64)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def _run_process(specs: List[str], connections: int, requests: int, options: Dict[str, object], seed: int) -> Dict[str, object]:
+    _raise_fd_limit(connections)
+    # Timed here so process start-up is not counted
+    started = time.perf_counter()
+    stats = asyncio.run(_drive(specs, connections, requests, options, seed))
+    stats["elapsed"] = time.perf_counter() - started
+    return stats
+
+
+def _merge(into: Dict[str, object], stats: Dict[str, object]):
+    for key in ("status", "errors"):
+        for name, count in stats[key].items():
+            into[key][name] = into[key].get(name, 0) + count
+    into["bytes"] += stats["bytes"]
+    into["connects"] += stats["connects"]
+    into["latency"].merge(stats["latency"])
+    for label, per_url in stats["per_url"].items():
+        mine = into["per_url"].setdefault(label, {"status": {}, "errors": {}, "latency": LatencyHistogram()})
+        for key in ("status", "errors"):
+            for name, count in per_url[key].items():
+                mine[key][name] = mine[key].get(name, 0) + count
+        mine["latency"].merge(per_url["latency"])
+
+
+def _split(total: int, parts: int) -> List[int]:
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def run_concurrency(
+    url,
+    n: int,
+    requests: int | None = None,
+    processes: int = 1,
+    keep_alive: bool = True,
+    timeout: float = 10.0,
+    seed: int = 0,
+) -> Dict[str, object]:
+    """Drive ``n`` concurrent connections with asyncio and print a summary.
+
+    ``url`` is one URL or a list of ``URL[@weight]`` specs to mix. ``requests``
+    defaults to one per connection. With ``processes`` > 1 the connections
+    and requests are split over that many processes, each with its own
+    event loop, so the client can use several cores.
+    """
+    specs = [url] if isinstance(url, str) else list(url)
+    requests = n if requests is None else requests
+    options = {"keep_alive": keep_alive, "timeout": timeout}
+    processes = max(1, min(processes, n, requests))
+
+    if processes == 1:
+        parts = [_run_process(specs, n, requests, options, seed)]
+    else:
+        jobs = [
+            (specs, conns, reqs, options, seed + i)
+            for i, (conns, reqs) in enumerate(zip(_split(n, processes), _split(requests, processes)))
+        ]
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            parts = pool.starmap(_run_process, jobs)
+    elapsed = max(part["elapsed"] for part in parts)
+
+    stats = _new_stats()
+    for part in parts:
+        _merge(stats, part)
+    completed = sum(stats["status"].values())
+    result = {
+        "urls": specs,
+        "connections": n,
+        "processes": processes,
+        "keep_alive": keep_alive,
+        "requests": completed + sum(stats["errors"].values()),
+        "elapsed_sec": elapsed,
+        "throughput_rps": completed / elapsed if elapsed > 0 else 0.0,
+        "bytes": stats["bytes"],
+        "connects": stats["connects"],
+        "status": {str(code): stats["status"][code] for code in sorted(stats["status"])},
+        "errors": stats["errors"],
+        "latency": stats["latency"].summary(),
+        "per_url": {
+            label: {
+                "status": {str(code): per_url["status"][code] for code in sorted(per_url["status"])},
+                "errors": per_url["errors"],
+                "latency": per_url["latency"].summary(),
+            }
+            for label, per_url in stats["per_url"].items()
+        },
+    }
+
+    print(f"Completed {result['requests']} requests in {elapsed:.2f}s ({result['throughput_rps']:.0f} req/s, {stats['connects']} connections opened)")
+    for st in sorted(stats["status"].keys()):
+        print(f"  {st}: {stats['status'][st]}")
+    for name, count in sorted(stats["errors"].items()):
+        print(f"  {name}: {count}")
+    print("  latency ms: " + "  ".join(f"{key[:-3]}={value:.2f}" for key, value in result["latency"].items() if key.endswith("_ms")))
+    if len(result["per_url"]) > 1:
+        for label, per_url in result["per_url"].items():
+            p99 = per_url["latency"]["p99_ms"]
+            print(f"  {label}: {per_url['status']} p50={per_url['latency']['p50_ms']:.2f}ms p99={p99:.2f}ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio load client: many concurrent keep-alive connections from one process.")
+    parser.add_argument("urls", nargs="*", default=["http://localhost:3333/"], metavar="URL[@WEIGHT]",
+                        help="URLs to request, mixed by weight (default: http://localhost:3333/)")
+    parser.add_argument("-c", "--concurrency", type=int, default=22, help="concurrent connections (default: 22)")
+    parser.add_argument("-n", "--requests", type=int, help="total requests (default: one per connection)")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="client processes to spread the load over (default: 1)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds per connect and per response (default: 10)")
+    parser.add_argument("--no-keepalive", action="store_true", help="open a new connection for every request")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the URL mix")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    print(f"Running {args.requests or args.concurrency} requests over {args.concurrency} connections to {', '.join(args.urls)}")
+    result = run_concurrency(args.urls, args.concurrency, args.requests, args.processes, not args.no_keepalive, args.timeout, args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
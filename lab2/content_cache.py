@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+
+class CacheEntry:
+    __slots__ = ("body", "content_type", "size", "mtime_ns", "etag", "last_modified")
+
+    def __init__(self, body: bytes, content_type: str, size: int, mtime_ns: int, etag: str = "", last_modified: str = ""):
+        self.body = body
+        self.content_type = content_type
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # Validator header values, formatted once when the file is cached
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ContentCache:
+    """In-memory file content cache bounded by total body bytes.
+
+    Entries are evicted least-recently-used first and are dropped as soon as
+    the caller reports a different size or mtime for the file.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_object_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, size: int, mtime_ns: int) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.size != size or entry.mtime_ns != mtime_ns:
+                # File changed on disk since it was cached
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key: str, size: int, mtime_ns: int) -> bool:
+        # Whether get() would hit; changes neither the LRU order nor the counters
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.size == size and entry.mtime_ns == mtime_ns
+
+    def put(
+        self,
+        key: str,
+        body: bytes,
+        content_type: str,
+        size: int,
+        mtime_ns: int,
+        etag: str = "",
+        last_modified: str = "",
+    ) -> bool:
+        if len(body) != size or size > self.max_object_bytes or size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(body, content_type, size, mtime_ns, etag, last_modified)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_object_bytes": self.max_object_bytes,
+            }
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+
+class CountJournal:
+    """Write-behind persistence for the request counters.
+
+    A background thread asks for the counters that changed since the last
+    flush every ``flush_interval`` seconds and appends them to an
+    append-only log, one ``path<TAB>count`` line each. The last line for a
+    path wins, so replay is a single pass of dict stores. When the log holds
+    far more lines than there are paths it is compacted: replayed, rewritten
+    with one line per path and atomically renamed over the old log.
+
+    Request handlers never call into this class; the worst a crash can lose
+    is the last ``flush_interval`` seconds of increments.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, compact_min_lines: int = 100000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_min_lines = compact_min_lines
+        # Paths in the log as of the last load or compaction
+        self._keys = 0
+        self._log_lines = 0
+        # Entries of a flush that failed to write, retried with the next one
+        self._unwritten: Dict[str, int] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._changed: Callable[[], Dict[str, int]] | None = None
+
+        self.flushes = 0
+        self.compactions = 0
+        self.last_flush_sec = 0.0
+
+    def load(self) -> Dict[str, int]:
+        counts, lines = self._replay()
+        self._keys = len(counts)
+        self._log_lines = lines
+        return counts
+
+    def _replay(self):
+        counts: Dict[str, int] = {}
+        lines = 0
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        # One decode for the whole file; per line only a split and a dict store
+        for line in data.decode("utf-8", "surrogateescape").split("\n"):
+            key, sep, count = line.rpartition("\t")
+            # A torn last line from a crash has no count and is skipped
+            if not sep or not count.isdigit():
+                continue
+            if "\\" in key:
+                key = _unescape(key)
+            counts[key] = int(count)
+            lines += 1
+        return counts, lines
+
+    def start(self, changed: Callable[[], Dict[str, int]]):
+        # `changed` returns the current count of every path incremented since
+        # its previous call, so a flush costs only what changed.
+        self._changed = changed
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._stopped.clear()
+        self._flusher = threading.Thread(target=self._flush_forever, name="counts-journal", daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        # Final flush so a clean shutdown loses nothing
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5.0)
+            self._flusher = None
+        if self._changed is not None:
+            self.flush(self._changed())
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flush_forever(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush(self._changed())
+            except OSError as e:
+                print(f"✗ Error writing counters to {self.path}: {e}")
+
+    def flush(self, changed: Dict[str, int]) -> int:
+        started = time.monotonic()
+        with self._lock:
+            if self._unwritten:
+                # Counts only grow, so the newer entries win
+                self._unwritten.update(changed)
+                changed, self._unwritten = self._unwritten, {}
+            if not changed:
+                return 0
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "ab")
+                self._file.write(b"".join(_encode_line(key, count) for key, count in changed.items()))
+                self._file.flush()
+            except OSError:
+                self._unwritten = changed
+                raise
+            self._log_lines += len(changed)
+            # Paths first seen since the last compaction are not in `_keys`,
+            # so this errs towards compacting early, never late.
+            if self._log_lines > max(self.compact_min_lines, 2 * self._keys):
+                self._compact()
+            self.flushes += 1
+            self.last_flush_sec = time.monotonic() - started
+            return len(changed)
+
+    def _compact(self):
+        # Runs on the flusher thread, so replaying the log here never holds
+        # up an increment.
+        counts, _ = self._replay()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(_encode_line(key, count) for key, count in counts.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "ab")
+        self._keys = self._log_lines = len(counts)
+        self.compactions += 1
+
+    def stats(self) -> Dict[str, float]:
+        # Plain reads without the lock: a compaction must not stall a scrape
+        return {
+            "keys": self._keys,
+            "log_lines": self._log_lines,
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "last_flush_sec": self.last_flush_sec,
+        }
+
+
+def _encode_line(key: str, count: int) -> bytes:
+    # Backslashes and newlines are escaped so every entry stays on one line;
+    # tabs need no escaping because the count is split off the right.
+    if "\\" in key or "\n" in key:
+        key = key.replace("\\", "\\\\").replace("\n", "\\n")
+    return f"{key}\t{count}\n".encode("utf-8", "surrogateescape")
+
+
+def _unescape(key: str) -> str:
+    out = []
+    i = 0
+    while i < len(key):
+        ch = key[i]
+        if ch == "\\" and i + 1 < len(key):
+            nxt = key[i + 1]
+            out.append("\n" if nxt == "n" else nxt)
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
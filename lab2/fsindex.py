@@ -0,0 +1,381 @@
+import ctypes
+import ctypes.util
+import hashlib
+import math
+import os
+import select
+import struct
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+# inotify(7) event bits
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+_WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class BloomFilter:
+    """Bit array answering "definitely absent" or "maybe present".
+
+    About 10 bits per key at a 1% false-positive rate, no matter how long
+    the keys are. Keys cannot be removed; a deleted path just stays a
+    "maybe" and falls through to the filesystem.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode("utf-8", "surrogateescape"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class _IndexedDir:
+    # Names only, no per-entry paths: a file costs one short string in a set
+    __slots__ = ("mtime_ns", "files", "dirs")
+
+    def __init__(self, mtime_ns: int, files: frozenset, dirs: frozenset):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.dirs = dirs
+
+
+class FileIndex:
+    """In-memory index of the served tree.
+
+    Built with one ``scandir`` walk at startup and kept current with inotify
+    where it is available, otherwise by polling directory mtimes every
+    ``poll_interval`` seconds. It answers filename searches and, through a
+    Bloom filter, lets requests for paths that do not exist be answered
+    without touching the filesystem. That only holds while inotify keeps
+    the index current; a polled index may lag the disk, so then every path
+    is reported as possibly present. Symlinked directories are not walked;
+    paths below them are always reported as possibly present.
+    """
+
+    def __init__(self, root: str, poll_interval: float = 5.0, use_inotify: bool = True, error_rate: float = 0.01):
+        self.root = os.path.abspath(root)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.error_rate = error_rate
+        # Relative directory ("" for the root) -> its entries
+        self._dirs: Dict[str, _IndexedDir] = {}
+        # Symlinked or unreadable directories whose contents are unknown
+        self._opaque: Set[str] = set()
+        self._bloom = BloomFilter(1024, error_rate)
+        self._lock = threading.Lock()
+        self._watcher: threading.Thread | None = None
+        # Set once inotify watches cover the tree; with _applying, tells
+        # whether every change the kernel reported is already in the index
+        self._inotify: "_Inotify | None" = None
+        self._applying = False
+        self.mode = "off"
+
+        self.entries = 0
+        self.rescans = 0
+        self.build_sec = 0.0
+
+    #  Building
+    def build(self):
+        started = time.monotonic()
+        dirs: Dict[str, _IndexedDir] = {}
+        opaque: Set[str] = set()
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            scanned = self._scan_dir(rel_dir, opaque)
+            if scanned is None:
+                continue
+            dirs[rel_dir] = scanned
+            prefix = rel_dir + "/" if rel_dir else ""
+            stack.extend(prefix + name for name in scanned.dirs if prefix + name not in opaque)
+        with self._lock:
+            self._dirs = dirs
+            self._opaque = opaque
+            self._rebuild_bloom()
+        self.build_sec = time.monotonic() - started
+
+    def _scan_dir(self, rel_dir: str, opaque: Set[str]) -> _IndexedDir | None:
+        full = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        try:
+            st = os.stat(full)
+            files, subdirs = [], []
+            with os.scandir(full) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                        if entry.is_symlink():
+                            opaque.add(f"{rel_dir}/{entry.name}" if rel_dir else entry.name)
+                    else:
+                        files.append(entry.name)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # Unreadable: exists, contents unknown
+            if rel_dir:
+                opaque.add(rel_dir)
+            return None
+        return _IndexedDir(st.st_mtime_ns, frozenset(files), frozenset(subdirs))
+
+    def _rebuild_bloom(self):
+        # Caller holds the lock. Sized with headroom so new files fit
+        # before the next rebuild.
+        entries = sum(len(d.files) + len(d.dirs) for d in self._dirs.values())
+        bloom = BloomFilter(max(1024, entries * 2), self.error_rate)
+        for rel_dir, indexed in self._dirs.items():
+            prefix = rel_dir + "/" if rel_dir else ""
+            for name in indexed.files:
+                bloom.add(prefix + name)
+            for name in indexed.dirs:
+                bloom.add(prefix + name)
+        self._bloom = bloom
+        self.entries = entries
+
+    #  Queries
+    def might_exist(self, rel_path: str) -> bool:
+        """False only if ``rel_path`` (as produced by os.path.relpath) is
+        certainly not in the tree."""
+        if not rel_path:
+            return True
+        if self._opaque:
+            for prefix in self._opaque:
+                if rel_path == prefix or rel_path.startswith(prefix + "/"):
+                    return True
+        # The filter is only as current as the index: a file created since
+        # its directory was last scanned must not be reported missing.
+        # Checked before the lookup, so a batch applied in between cannot
+        # make a stale answer look current.
+        current = self._current()
+        return not current or rel_path in self._bloom
+
+    def _current(self) -> bool:
+        inotify = self._inotify
+        if inotify is None:
+            # Polled (or not yet watched): up to poll_interval behind
+            return False
+        # A file is queued as an event before creating it returns, so with
+        # nothing queued and no batch being applied the index has it. The
+        # queue is checked first: the watcher sets _applying before it reads.
+        return not inotify.pending() and not self._applying
+
+    def search(self, term: str, under: str = "", limit: int = 200) -> List[Tuple[str, bool]]:
+        """Case-insensitive substring match on names below ``under``;
+        returns (relative path, is directory) pairs, sorted."""
+        needle = term.lower()
+        prefix = under + "/" if under else ""
+        results = []
+        with self._lock:
+            items = list(self._dirs.items())
+        for rel_dir, indexed in items:
+            if under and rel_dir != under and not rel_dir.startswith(prefix):
+                continue
+            base = rel_dir + "/" if rel_dir else ""
+            for name in indexed.dirs:
+                if needle in name.lower():
+                    results.append((base + name, True))
+            for name in indexed.files:
+                if needle in name.lower():
+                    results.append((base + name, False))
+        results.sort()
+        return results[:limit]
+
+    #  Updates
+    def refresh(self, rel_dir: str) -> List[str]:
+        """Rescan one directory and apply what changed to the index."""
+        opaque: Set[str] = set()
+        scanned = self._scan_dir(rel_dir, opaque)
+        new_dirs: List[str] = []
+        with self._lock:
+            self.rescans += 1
+            old = self._dirs.get(rel_dir)
+            prefix = rel_dir + "/" if rel_dir else ""
+            # Replaced, never mutated: might_exist() iterates it without the lock
+            if opaque:
+                self._opaque = self._opaque | opaque
+            if scanned is None:
+                self._drop_subtree(rel_dir)
+                return []
+            self._dirs[rel_dir] = scanned
+            old_files = old.files if old is not None else frozenset()
+            old_subdirs = old.dirs if old is not None else frozenset()
+            added = (scanned.files - old_files) | (scanned.dirs - old_subdirs)
+            for name in scanned.dirs - old_subdirs:
+                if prefix + name not in self._opaque:
+                    new_dirs.append(prefix + name)
+            for name in old_subdirs - scanned.dirs:
+                self._drop_subtree(prefix + name)
+            self.entries += len(added) - len((old_files - scanned.files) | (old_subdirs - scanned.dirs))
+            # Added before anything can ask for them: no false 404s
+            for name in added:
+                self._bloom.add(prefix + name)
+            if self._bloom.count > self._bloom.capacity:
+                self._rebuild_bloom()
+        # New subtrees are indexed outside the lock, one directory at a time;
+        # the caller gets every directory that was added, to watch them
+        added_dirs = []
+        for sub in new_dirs:
+            added_dirs.append(sub)
+            added_dirs.extend(self.refresh(sub))
+        return added_dirs
+
+    def _drop_subtree(self, rel_dir: str):
+        # Caller holds the lock
+        prefix = rel_dir + "/"
+        for key in [key for key in self._dirs if key == rel_dir or key.startswith(prefix)]:
+            del self._dirs[key]
+        self._opaque = {p for p in self._opaque if p != rel_dir and not p.startswith(prefix)}
+
+    def start(self):
+        # Called in each serving process: threads and inotify fds are per process
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        inotify = _Inotify.open() if self.use_inotify else None
+        if inotify is not None:
+            self.mode = "inotify"
+            target, args = self._watch_inotify, (inotify,)
+        else:
+            self.mode = "polling"
+            target, args = self._poll_forever, ()
+        self._watcher = threading.Thread(target=target, args=args, name="fs-index", daemon=True)
+        self._watcher.start()
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                items = list(self._dirs.items())
+            for rel_dir, indexed in items:
+                full = os.path.join(self.root, rel_dir) if rel_dir else self.root
+                try:
+                    mtime_ns = os.stat(full).st_mtime_ns
+                except OSError:
+                    mtime_ns = None
+                if mtime_ns != indexed.mtime_ns:
+                    self.refresh(rel_dir)
+
+    def _watch_inotify(self, inotify: "_Inotify"):
+        watches: Dict[int, str] = {}
+
+        def watch(rel_dir: str) -> bool:
+            wd = inotify.add_watch(os.path.join(self.root, rel_dir) if rel_dir else self.root)
+            if wd < 0:
+                return False
+            watches[wd] = rel_dir
+            return True
+
+        with self._lock:
+            initial = list(self._dirs)
+        for rel_dir in initial:
+            if not watch(rel_dir):
+                # Out of watches (fs.inotify.max_user_watches): poll instead
+                inotify.close()
+                self.mode = "polling"
+                self._poll_forever()
+                return
+        # Changes made while the watches were being added
+        for rel_dir in initial:
+            self.refresh(rel_dir)
+        self._inotify = inotify
+
+        while True:
+            inotify.wait()
+            self._applying = True
+            changed: Set[str] = set()
+            overflow = False
+            for wd, mask, name in inotify.read_events():
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    watches.pop(wd, None)
+                elif wd in watches:
+                    changed.add(watches[wd])
+            if overflow:
+                # Events were lost: start over from a fresh walk
+                self.build()
+                changed = set(self._dirs)
+            # One rescan per directory per batch of events
+            for rel_dir in sorted(changed):
+                for new_dir in self.refresh(rel_dir):
+                    watch(new_dir)
+                    # Files created before the watch existed
+                    self.refresh(new_dir)
+            self._applying = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "directories": len(self._dirs),
+                "entries": self.entries,
+                "rescans": self.rescans,
+                "build_sec": round(self.build_sec, 3),
+                "bloom_bytes": len(self._bloom.bits),
+            }
+
+
+class _Inotify:
+    # Minimal ctypes binding; None from open() when inotify is unavailable
+    def __init__(self, libc, fd: int):
+        self._libc = libc
+        self.fd = fd
+
+    @classmethod
+    def open(cls) -> "_Inotify | None":
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        return cls(libc, fd) if fd >= 0 else None
+
+    def add_watch(self, path: str) -> int:
+        return self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+
+    def wait(self):
+        select.select([self.fd], [], [])
+
+    def pending(self) -> bool:
+        # Events queued but not yet read; a non-blocking check, no disk access
+        return bool(select.select([self.fd], [], [], 0)[0])
+
+    def read_events(self):
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
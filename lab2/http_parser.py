@@ -0,0 +1,208 @@
+"""Incremental HTTP/1.x request parser shared by the lab1 and lab2 servers.
+
+Bytes are fed as they arrive from the socket and complete requests come
+out, so requests split across TCP segments and pipelined requests are both
+handled. Only the request line and individual header fields are decoded.
+
+Run this file directly for a micro-benchmark of the parse cost per request:
+
+    python http_parser.py [iterations]
+"""
+import sys
+import time
+from typing import Dict, List
+from urllib.parse import unquote
+
+# Limits: larger heads are rejected instead of being buffered forever
+MAX_HEAD_BYTES = 65536
+MAX_LINE_BYTES = 8192
+MAX_HEADERS = 100
+
+
+class HTTPParseError(Exception):
+    """Malformed or oversized request; ``status`` is the HTTP error to send."""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(f"{status} {reason}")
+        self.status = status
+        self.reason = reason
+
+
+class HTTPRequest:
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str]):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # lower-cased names, repeated fields joined with ", "
+        raw_path, _, self.query = target.partition("?")
+        self.path = unquote(raw_path)
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = "close" not in connection
+        else:
+            self.keep_alive = "keep-alive" in connection
+        # Filled in by the server when it builds the response head
+        self.status = 0
+        self.response_bytes = 0
+        self.head_at = 0.0  # time.monotonic() when the response head was built
+
+
+class RequestParser:
+    """Turns a stream of bytes from one connection into HTTPRequest objects.
+
+    ``feed`` never raises: after a malformed request the requests parsed so
+    far are still returned, ``error`` is set and the parser is closed.
+    """
+
+    def __init__(self, max_head_bytes: int = MAX_HEAD_BYTES, max_line_bytes: int = MAX_LINE_BYTES, max_headers: int = MAX_HEADERS):
+        self.max_head_bytes = max_head_bytes
+        self.max_line_bytes = max_line_bytes
+        self.max_headers = max_headers
+        self._buffer = bytearray()
+        # Where to resume looking for the blank line, so a head arriving in
+        # many small segments is not rescanned from the start every time
+        self._scan_from = 0
+        # Body bytes of the last request still to be skipped
+        self._skip_body = 0
+        # Set when nothing more can be parsed (error or chunked request body)
+        self.closed = False
+        self.error: HTTPParseError | None = None
+
+    def feed(self, data) -> List[HTTPRequest]:
+        if self.closed:
+            return []
+        self._buffer += data
+        requests: List[HTTPRequest] = []
+        try:
+            self._parse_requests(requests)
+        except HTTPParseError as e:
+            self.error = e
+            self.closed = True
+            self._buffer.clear()
+        return requests
+
+    def _parse_requests(self, requests: List[HTTPRequest]):
+        buffer = self._buffer
+        while True:
+            if self._skip_body:
+                taken = min(self._skip_body, len(buffer))
+                del buffer[:taken]
+                self._skip_body -= taken
+                if self._skip_body:
+                    break
+
+            # Tolerate stray CRLFs between pipelined requests (RFC 9112, 2.2)
+            while buffer[:2] == b"\r\n":
+                del buffer[:2]
+
+            end = buffer.find(b"\r\n\r\n", self._scan_from)
+            if end < 0:
+                if len(buffer) > self.max_head_bytes:
+                    raise HTTPParseError(431, "Request Header Fields Too Large")
+                # Only the last three bytes can begin a terminator
+                self._scan_from = max(0, len(buffer) - 3)
+                break
+            if end > self.max_head_bytes:
+                raise HTTPParseError(431, "Request Header Fields Too Large")
+
+            request = self._parse_head(bytes(buffer[:end]))
+            del buffer[:end + 4]
+            self._scan_from = 0
+            requests.append(request)
+
+            if "transfer-encoding" in request.headers:
+                # Chunked request bodies are not decoded, so nothing after
+                # this request can be framed: answer it and close.
+                request.keep_alive = False
+                self.closed = True
+                buffer.clear()
+                break
+            content_length = request.headers.get("content-length")
+            if content_length is not None:
+                # str.isdigit() also accepts Latin-1 digits such as "²", which int() rejects
+                if not (content_length.isascii() and content_length.isdigit()):
+                    raise HTTPParseError(400, "Bad Request")
+                self._skip_body = int(content_length)
+
+    def _parse_head(self, head: bytes) -> HTTPRequest:
+        lines = head.split(b"\r\n")
+        request_line = lines[0]
+        if len(request_line) > self.max_line_bytes:
+            raise HTTPParseError(414, "URI Too Long")
+        parts = request_line.split()
+        if len(parts) == 2:
+            # HTTP/0.9-style request line without a version
+            parts.append(b"HTTP/1.0")
+        if len(parts) != 3:
+            raise HTTPParseError(400, "Bad Request")
+        method, target, version = parts
+        version = version.upper()
+        if not version.startswith(b"HTTP/1."):
+            raise HTTPParseError(505, "HTTP Version Not Supported")
+        if len(lines) - 1 > self.max_headers:
+            raise HTTPParseError(431, "Request Header Fields Too Large")
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(b":")
+            # No whitespace before the colon and no obsolete line folding
+            if not sep or not name or name[-1:].isspace() or name[:1].isspace():
+                raise HTTPParseError(400, "Bad Request")
+            key = name.decode("latin-1").lower()
+            text = value.strip().decode("latin-1")
+            if key in headers:
+                headers[key] = headers[key] + ", " + text
+            else:
+                headers[key] = text
+        return HTTPRequest(method.decode("latin-1"), target.decode("latin-1"), version.decode("latin-1"), headers)
+
+
+def _benchmark(iterations: int):
+    sample = (
+        b"GET /img/UI.jpg?size=large HTTP/1.1\r\n"
+        b"Host: localhost:3333\r\n"
+        b"User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0\r\n"
+        b"Accept: image/avif,image/webp,image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5\r\n"
+        b"Accept-Language: en-US,en;q=0.5\r\n"
+        b"Accept-Encoding: gzip, deflate, br\r\n"
+        b"Referer: http://localhost:3333/img/\r\n"
+        b"Connection: keep-alive\r\n"
+        b"If-None-Match: \"11e04b-c97-18df3e646a9eb8bb\"\r\n"
+        b"\r\n"
+    )
+    pipelined = sample * 16
+    segments = [sample[i:i + 64] for i in range(0, len(sample), 64)]
+
+    def one_per_feed():
+        parser = RequestParser()
+        for _ in range(iterations):
+            parser.feed(sample)
+        return iterations
+
+    def pipelined_batches():
+        parser = RequestParser()
+        for _ in range(iterations // 16):
+            parser.feed(pipelined)
+        return iterations // 16 * 16
+
+    def split_segments():
+        parser = RequestParser()
+        for _ in range(iterations):
+            for segment in segments:
+                parser.feed(segment)
+        return iterations
+
+    print(f"Request size: {len(sample)} bytes, {iterations} iterations")
+    for name, case in (
+        ("one request per feed()", one_per_feed),
+        ("16 pipelined per feed()", pipelined_batches),
+        (f"split into {len(segments)} x 64-byte segments", split_segments),
+    ):
+        start = time.perf_counter()
+        parsed = case()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<34} {elapsed / parsed * 1e6:7.2f} us/request")
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,176 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from worker_pool import worker_slot
+
+# Upper bounds in seconds of the latency histogram buckets (+Inf is implicit)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _MetricsShard:
+    # Written only by the thread that owns it, so updates need no lock;
+    # the scraper reads all shards and adds them up. A pool slot's shard
+    # passes to the thread that takes over the slot.
+    __slots__ = ("status", "bytes_sent", "started", "finished", "buckets", "sums")
+
+    def __init__(self, stages: Iterable[str], bucket_count: int):
+        self.status: Dict[int, int] = {}
+        self.bytes_sent = 0
+        self.started = 0
+        self.finished = 0
+        self.buckets = {stage: [0] * (bucket_count + 1) for stage in stages}
+        self.sums = {stage: 0.0 for stage in stages}
+
+
+def merge_reports(reports: Iterable[Dict[str, object]], counters_only: bool = False) -> Dict[str, object]:
+    """Adds up reports of several worker processes.
+
+    A report is ``{"snapshot": Metrics.snapshot(), "extra": [(name, type,
+    help, value), ...]}``. With ``counters_only`` gauges are left out, for
+    folding in the last report of a worker that is gone.
+    """
+    snap: Dict[str, object] = {"status": {}, "buckets": {}, "sums": {}, "bytes_sent": 0, "in_flight": 0}
+    extra: Dict[str, list] = {}
+    for report in reports:
+        part = report["snapshot"]
+        for code, count in part["status"].items():
+            snap["status"][code] = snap["status"].get(code, 0) + count
+        for stage, counts in part["buckets"].items():
+            mine = snap["buckets"].setdefault(stage, [0] * len(counts))
+            for i, count in enumerate(counts):
+                mine[i] += count
+        for stage, seconds in part["sums"].items():
+            snap["sums"][stage] = snap["sums"].get(stage, 0.0) + seconds
+        snap["bytes_sent"] += part["bytes_sent"]
+        if not counters_only:
+            snap["in_flight"] += part["in_flight"]
+        for name, kind, help_text, value in report["extra"]:
+            if counters_only and kind != "counter":
+                continue
+            if name in extra:
+                extra[name][3] += value
+            else:
+                extra[name] = [name, kind, help_text, value]
+    return {"snapshot": snap, "extra": [tuple(sample) for sample in extra.values()]}
+
+
+class Metrics:
+    """Request metrics kept in per-thread shards (one per worker pool slot)
+    and rendered in the Prometheus text format.
+
+    Latency is split into stages: ``parse`` (request head parsing), ``fs``
+    (from dispatch until the response head is ready: path checks, stat,
+    open, read, listing render) and ``send`` (writing the response out).
+    """
+
+    STAGES = ("parse", "fs", "send")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[_MetricsShard] = []
+        self._slot_shards: Dict[int, _MetricsShard] = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> _MetricsShard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            # First request on this thread: the only time a lock is taken.
+            # Pool threads come and go, so theirs is kept per slot.
+            slot = worker_slot()
+            with self._shards_lock:
+                shard = self._slot_shards.get(slot) if slot is not None else None
+                if shard is None:
+                    shard = _MetricsShard(self.STAGES, len(self.bounds))
+                    self._shards.append(shard)
+                    if slot is not None:
+                        self._slot_shards[slot] = shard
+            self._local.shard = shard
+            return shard
+
+    def request_started(self):
+        self._shard().started += 1
+
+    def request_finished(self, status: int, body_bytes: int):
+        self._shard().finished += 1
+        self.count_response(status, body_bytes)
+
+    def count_response(self, status: int, body_bytes: int):
+        # Also used on its own for responses to requests that failed to parse
+        shard = self._shard()
+        shard.status[status] = shard.status.get(status, 0) + 1
+        shard.bytes_sent += body_bytes
+
+    def request_abandoned(self):
+        # Connection dropped before a response was completed
+        self._shard().finished += 1
+
+    def observe(self, stage: str, seconds: float, count: int = 1):
+        shard = self._shard()
+        shard.buckets[stage][bisect_left(self.bounds, seconds)] += count
+        shard.sums[stage] += seconds * count
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        status: Dict[int, int] = {}
+        buckets = {stage: [0] * (len(self.bounds) + 1) for stage in self.STAGES}
+        sums = {stage: 0.0 for stage in self.STAGES}
+        bytes_sent = started = finished = 0
+        for shard in shards:
+            # dict.copy() is atomic, so a concurrent insert cannot break the loop
+            for code, count in shard.status.copy().items():
+                status[code] = status.get(code, 0) + count
+            for stage in self.STAGES:
+                for i, count in enumerate(shard.buckets[stage]):
+                    buckets[stage][i] += count
+                sums[stage] += shard.sums[stage]
+            bytes_sent += shard.bytes_sent
+            started += shard.started
+            finished += shard.finished
+        return {
+            "status": status,
+            "buckets": buckets,
+            "sums": sums,
+            "bytes_sent": bytes_sent,
+            "in_flight": max(0, started - finished),
+        }
+
+    def render(self, extra: Iterable[Tuple[str, str, str, float]] = (), snap: Dict[str, object] | None = None) -> str:
+        """Prometheus text exposition; ``extra`` holds (name, type, help, value)
+        samples owned by the caller, e.g. gauges read at scrape time. ``snap``
+        replaces this process's snapshot, e.g. with the sum of all workers."""
+        if snap is None:
+            snap = self.snapshot()
+        lines = [
+            "# HELP http_requests_total Requests answered, by status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for code in sorted(snap["status"]):
+            lines.append(f'http_requests_total{{code="{code}"}} {snap["status"][code]}')
+
+        lines.append("# HELP http_request_stage_seconds Time spent per request in each stage.")
+        lines.append("# TYPE http_request_stage_seconds histogram")
+        for stage in self.STAGES:
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), snap["buckets"][stage]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'http_request_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'http_request_stage_seconds_sum{{stage="{stage}"}} {snap["sums"][stage]:.6f}')
+            lines.append(f'http_request_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        lines.append("# HELP http_response_body_bytes_total Response body bytes sent.")
+        lines.append("# TYPE http_response_body_bytes_total counter")
+        lines.append(f"http_response_body_bytes_total {snap['bytes_sent']}")
+        lines.append("# HELP http_requests_in_flight Requests currently being served.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {snap['in_flight']}")
+
+        for name, kind, help_text, value in extra:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
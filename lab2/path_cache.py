@@ -0,0 +1,72 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+
+class PathInfo:
+    # What serving a URL path needs to know about the file behind it.
+    # `st` is None when the path does not exist.
+    __slots__ = ("full_path", "rel", "st", "is_dir", "content_type", "expires")
+
+    def __init__(self, full_path: str, rel: str, st: os.stat_result | None, content_type: str, expires: float):
+        self.full_path = full_path
+        self.rel = rel
+        self.st = st
+        self.is_dir = st is not None and stat.S_ISDIR(st.st_mode)
+        self.content_type = content_type
+        self.expires = expires
+
+
+class PathCache:
+    """Bounded map from URL path to resolved path metadata.
+
+    Entries are trusted for ``ttl`` seconds, so a hot path is resolved,
+    checked and stat'ed once per TTL instead of on every request. A file
+    that changes is noticed at most ``ttl`` seconds late. Misses (404s) are
+    cached too, so scanning for missing files costs no syscalls either.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, PathInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url_path: str) -> PathInfo | None:
+        with self._lock:
+            info = self._entries.get(url_path)
+            if info is None or info.expires < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url_path)
+            self.hits += 1
+            return info
+
+    def peek(self, url_path: str) -> PathInfo | None:
+        # Like get(), without touching the LRU order or the counters
+        with self._lock:
+            info = self._entries.get(url_path)
+        if info is None or info.expires < time.monotonic():
+            return None
+        return info
+
+    def put(self, url_path: str, full_path: str, rel: str, st: os.stat_result | None, content_type: str) -> PathInfo:
+        info = PathInfo(full_path, rel, st, content_type, time.monotonic() + self.ttl)
+        if self.ttl <= 0:
+            return info
+        with self._lock:
+            self._entries[url_path] = info
+            self._entries.move_to_end(url_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
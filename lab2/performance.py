@@ -1,205 +1,513 @@
 #!/usr/bin/env python3
 
+import argparse
+import contextlib
+import json
+import math
 import socket
-import time
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
-from typing import List, Tuple
 import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+# Histogram resolution: values are kept to 1/128 of their power of two (<0.8%)
+_SUB_BITS = 8
+_HALF = 1 << (_SUB_BITS - 1)
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram with log-linear buckets in microseconds.
+
+    Memory stays constant however many samples are recorded, every value is
+    kept within 0.8% of its true value, and histograms from several
+    threads or runs can be merged exactly.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < 2 * _HALF:
+            return value
+        shift = value.bit_length() - _SUB_BITS
+        return (shift << (_SUB_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def _value(index: int) -> int:
+        # Highest value that lands in the bucket, as HdrHistogram reports it
+        if index < 2 * _HALF:
+            return index
+        shift = (index >> (_SUB_BITS - 1)) - 1
+        mantissa = index - (shift << (_SUB_BITS - 1))
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        if self.count == 0 or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+        self.count += 1
+        self.total_us += value
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        if other.count:
+            self.min_us = other.min_us if self.count == 0 else min(self.min_us, other.min_us)
+            self.max_us = max(self.max_us, other.max_us)
+        self.count += other.count
+        self.total_us += other.total_us
+
+    def percentile(self, percent: float) -> int:
+        if self.count == 0:
+            return 0
+        rank = max(1, math.ceil(self.count * percent / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max_us)
+        return self.max_us
+
+    def summary(self) -> Dict[str, float]:
+        """Milliseconds: count, min, mean, p50/p90/p99/p99.9 and max."""
+        result = {
+            "count": self.count,
+            "min_ms": self.min_us / 1000,
+            "mean_ms": self.total_us / self.count / 1000 if self.count else 0.0,
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent:g}_ms"] = self.percentile(percent) / 1000
+        result["max_ms"] = self.max_us / 1000
+        return result
+
+
+class _Connection:
+    """One client connection; reused across requests when keep-alive is on."""
+
+    def __init__(self, host: str, port: int, keep_alive: bool, timeout: float):
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.sock: socket.socket | None = None
+        self.buffer = bytearray()
+        self.connects = 0
+
+    def request(self, resource: str) -> int:
+        """Sends a GET and reads the whole response; returns the status code."""
+        reused = self.sock is not None
+        try:
+            return self._exchange(resource)
+        except (ConnectionError, socket.timeout, OSError):
+            self.close()
+            if not reused:
+                raise
+        # The server may close an idle keep-alive connection between two
+        # requests; that is not a failed request, so retry once on a new one.
+        return self._exchange(resource)
+
+    def _exchange(self, resource: str) -> int:
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.buffer.clear()
+            self.connects += 1
+        connection = "keep-alive" if self.keep_alive else "close"
+        request = f"GET /{resource} HTTP/1.1\r\nHost: {self.host}\r\nConnection: {connection}\r\n\r\n"
+        self.sock.sendall(request.encode("utf-8"))
+        status, reusable = self._read_response()
+        if not (reusable and self.keep_alive):
+            self.close()
+        return status
+
+    def _recv(self) -> bool:
+        data = self.sock.recv(65536)
+        self.buffer += data
+        return bool(data)
+
+    def _read_response(self) -> Tuple[int, bool]:
+        while True:
+            end = self.buffer.find(b"\r\n\r\n")
+            if end >= 0:
+                break
+            if not self._recv():
+                raise ConnectionError("connection closed before a response")
+        lines = bytes(self.buffer[:end]).decode("latin-1").split("\r\n")
+        del self.buffer[:end + 4]
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        reusable = headers.get("connection") != "close"
+        if "chunked" in headers.get("transfer-encoding", ""):
+            self._skip_chunked()
+        elif "content-length" in headers:
+            self._skip(int(headers["content-length"]))
+        else:
+            # Body runs until the server closes the connection
+            while self._recv():
+                self.buffer.clear()
+            reusable = False
+        return status, reusable
+
+    def _skip(self, length: int):
+        while len(self.buffer) < length:
+            length -= len(self.buffer)
+            self.buffer.clear()
+            if not self._recv():
+                raise ConnectionError("connection closed mid-body")
+        del self.buffer[:length]
+
+    def _skip_chunked(self):
+        while True:
+            while b"\r\n" not in self.buffer:
+                if not self._recv():
+                    raise ConnectionError("connection closed mid-body")
+            line, _, _ = bytes(self.buffer).partition(b"\r\n")
+            del self.buffer[:len(line) + 2]
+            size = int(line.split(b";")[0], 16)
+            # Chunk data plus its CRLF; the last chunk is followed by an empty trailer
+            self._skip(size + 2)
+            if size == 0:
+                return
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class _RunSchedule:
+    """Hands out request slots to the connection threads.
+
+    In open-loop mode slot ``i`` is due at ``start + i / rate`` whether or not
+    earlier requests have finished. Latency is measured from that due time,
+    so time a request spends waiting behind a slow one is counted instead of
+    hidden (coordinated omission).
+    """
+
+    def __init__(self, rate: float | None, warmup: float, duration: float | None, requests: int | None):
+        self.rate = rate
+        self.requests = requests
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.measure_from = self.start + warmup
+        self.stop_at = self.measure_from + duration if duration is not None else math.inf
+        self.issued = 0
+        self.measured = 0
+
+    def next_slot(self) -> Tuple[float, bool] | None:
+        with self._lock:
+            now = time.perf_counter()
+            due = self.start + self.issued / self.rate if self.rate else now
+            if due >= self.stop_at:
+                return None
+            measured = due >= self.measure_from
+            if measured:
+                if self.requests is not None and self.measured >= self.requests:
+                    return None
+                self.measured += 1
+            self.issued += 1
+            return due, measured
 
 
 class ConcurrentTester:
     """Tests HTTP server performance with concurrent requests."""
 
-    def __init__(self, host: str, port: int, server_name: str):
+    def __init__(self, host: str, port: int, server_name: str, keep_alive: bool = True, timeout: float = 30.0):
         self.host = host
         self.port = port
         self.server_name = server_name
+        self.keep_alive = keep_alive
+        self.timeout = timeout
 
-    def _send_single_request(self, resource: str) -> Tuple[float, bool]:
+    def _connection_loop(self, schedule: _RunSchedule, resource: str, result: Dict[str, object]):
+        connection = _Connection(self.host, self.port, self.keep_alive, self.timeout)
+        latency = result["latency"]
+        service = result["service"]
+        status_counts = result["status"]
+        errors = result["errors"]
+        try:
+            while True:
+                slot = schedule.next_slot()
+                if slot is None:
+                    return
+                due, measured = slot
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                sent = time.perf_counter()
+                try:
+                    status = connection.request(resource)
+                except Exception as e:
+                    connection.close()
+                    if measured:
+                        name = type(e).__name__
+                        errors[name] = errors.get(name, 0) + 1
+                    continue
+                done = time.perf_counter()
+                if measured:
+                    latency.record(done - due)
+                    service.record(done - sent)
+                    status_counts[status] = status_counts.get(status, 0) + 1
+        finally:
+            result["connects"] += connection.connects
+            connection.close()
+
+    def run(
+        self,
+        resource: str = "",
+        connections: int = 10,
+        requests: int | None = None,
+        duration: float | None = None,
+        warmup: float = 0.0,
+        rate: float | None = None,
+    ) -> Dict[str, object]:
         """
-        Sends a single HTTP GET request and returns (time_taken, success).
+        Runs a load test and returns its results as a JSON-serialisable dict.
+
+        Args:
+            resource: The resource path to request (default: root)
+            connections: Concurrent connections, one thread each
+            requests: Stop after this many measured requests
+            duration: Stop after this many measured seconds
+            warmup: Seconds of load sent before measuring starts
+            rate: Open-loop arrival rate in requests/second; None runs
+                closed-loop, each connection sending as soon as it is free
         """
-        start_time = time.time()
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                request = f"GET /{resource} HTTP/1.1\r\nHost: {self.host}\r\nConnection: close\r\n\r\n"
-                s.sendall(request.encode("utf-8"))
-
-                # Receive the full response
-                chunks = []
-                while True:
-                    data = s.recv(4096)
-                    if not data:
-                        break
-                    chunks.append(data)
-
-            elapsed = time.time() - start_time
-            return elapsed, True
-        except Exception as e:
-            elapsed = time.time() - start_time
-            print(f"Error requesting {resource}: {e}", file=sys.stderr)
-            return elapsed, False
-
-    def test_concurrent_requests(
-        self, resource: str = "", num_requests: int = 10, num_workers: int = 10
-    ) -> Tuple[float, int, List[float]]:
+        if requests is None and duration is None:
+            requests = connections
+        per_thread = [
+            {"latency": LatencyHistogram(), "service": LatencyHistogram(), "status": {}, "errors": {}, "connects": 0}
+            for _ in range(connections)
+        ]
+        schedule = _RunSchedule(rate, warmup, duration, requests)
+        threads = [
+            threading.Thread(target=self._connection_loop, args=(schedule, resource, result), daemon=True)
+            for result in per_thread
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - max(schedule.measure_from, schedule.start)
+
+        latency, service = LatencyHistogram(), LatencyHistogram()
+        status: Dict[int, int] = {}
+        errors: Dict[str, int] = {}
+        connects = 0
+        for result in per_thread:
+            latency.merge(result["latency"])
+            service.merge(result["service"])
+            for code, count in result["status"].items():
+                status[code] = status.get(code, 0) + count
+            for name, count in result["errors"].items():
+                errors[name] = errors.get(name, 0) + count
+            connects += result["connects"]
+        completed = sum(status.values())
+        return {
+            "server": self.server_name,
+            "url": f"http://{self.host}:{self.port}/{resource}",
+            "mode": "open" if rate else "closed",
+            "rate": rate,
+            "connections": connections,
+            "keep_alive": self.keep_alive,
+            "warmup_sec": warmup,
+            "elapsed_sec": elapsed,
+            "requests": completed + sum(errors.values()),
+            "ok": sum(count for code, count in status.items() if code < 400),
+            "status": {str(code): status[code] for code in sorted(status)},
+            "errors": errors,
+            "connects": connects,
+            "throughput_rps": completed / elapsed if elapsed > 0 else 0.0,
+            # Open loop: from the scheduled start; closed loop both are equal
+            "latency": latency.summary(),
+            "service_time": service.summary(),
+        }
+
+    def test_concurrent_requests(self, resource: str = "", num_requests: int = 10, num_workers: int | None = None, **options) -> Dict[str, object]:
         """
-        Makes concurrent requests to the server and measures performance.
+        Makes concurrent requests to the server, prints and returns the results.
 
         Args:
             resource: The resource path to request (default: root)
-            num_requests: Number of concurrent requests
-            num_workers: Number of worker threads (default: same as num_requests)
-        
-        Returns:
-            Tuple of (overall_time, successful_requests, times_list)
+            num_requests: Number of measured requests (None with a duration)
+            num_workers: Number of connections (default: same as num_requests)
+            options: duration, warmup and rate, as for run()
         """
+        connections = num_workers or num_requests or 10
         print(f"\n{'='*70}")
         print(f"Testing: {self.server_name}")
         print(f"URL: http://{self.host}:{self.port}/{resource}")
-        print(f"Concurrent requests: {num_requests}")
+        if options.get("rate"):
+            print(f"Open loop: {options['rate']:g} requests/second over {connections} connections")
+        else:
+            print(f"Closed loop: {connections} concurrent connections")
         print(f"{'='*70}\n")
 
-        times: List[float] = []
-        successful_requests = 0
-
-        # Record the overall start time
-        overall_start = time.time()
-
-        # Use ThreadPoolExecutor to handle concurrent requests
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            # Submit all requests
-            futures = [
-                executor.submit(self._send_single_request, resource)
-                for _ in range(num_requests)
-            ]
-
-            # Collect results as they complete
-            for i, future in enumerate(as_completed(futures), 1):
-                elapsed, success = future.result()
-                times.append(elapsed)
-                if success:
-                    successful_requests += 1
-                print(
-                    f"Request {i:2d}: {elapsed:.3f}s - {'✓' if success else '✗'}")
-
-        overall_elapsed = time.time() - overall_start
-
-        # Print statistics
-        print(f"\n{'-'*70}")
-        print(f"STATISTICS - {self.server_name}:")
-        print(f"{'-'*70}")
-        print(f"Successful requests: {successful_requests}/{num_requests}")
-        print(f"Total time (wall-clock): {overall_elapsed:.3f}s")
-        print(f"Average request time: {sum(times) / len(times):.3f}s")
-        print(f"Min request time: {min(times):.3f}s")
-        print(f"Max request time: {max(times):.3f}s")
-        print(
-            f"Throughput: {num_requests / overall_elapsed:.2f} requests/second")
-        print(f"{'-'*70}\n")
-
-        return overall_elapsed, successful_requests, times
+        result = self.run(resource, connections, num_requests, **options)
+        print_report(result)
+        return result
+
+
+def print_report(result: Dict[str, object]):
+    latency = result["latency"]
+    print(f"{'-'*70}")
+    print(f"STATISTICS - {result['server']}:")
+    print(f"{'-'*70}")
+    print(f"Successful requests: {result['ok']}/{result['requests']}")
+    print(f"Status codes: {result['status'] or '-'}" + (f", errors: {result['errors']}" if result["errors"] else ""))
+    print(f"Connections opened: {result['connects']} ({'keep-alive' if result['keep_alive'] else 'one per request'})")
+    print(f"Measured time (wall-clock): {result['elapsed_sec']:.3f}s")
+    print(f"Throughput: {result['throughput_rps']:.2f} requests/second")
+    print("Latency (ms): " + "  ".join(f"{key[:-3]}={value:.2f}" for key, value in latency.items() if key.endswith("_ms")))
+    if result["mode"] == "open":
+        service = result["service_time"]
+        print("Service (ms): " + "  ".join(f"{key[:-3]}={value:.2f}" for key, value in service.items() if key.endswith("_ms")))
+    print(f"{'-'*70}\n")
 
 
 def compare_servers(
-    single_host: str, 
+    single_host: str,
     single_port: int,
     multi_host: str,
     multi_port: int,
     resource: str = "",
-    num_requests: int = 10
-) -> None:
+    num_requests: int = 10,
+    **options
+) -> Dict[str, Dict[str, object]]:
     """
     Compares performance between single-threaded and multi-threaded servers.
+
+    Both servers get the same load (``options`` as for ConcurrentTester.run),
+    and the results of both runs are returned.
     """
     print("\n" + "="*70)
     print("SERVER PERFORMANCE COMPARISON TEST")
     print("="*70)
-    
+
+    keep_alive = options.pop("keep_alive", True)
     # Test single-threaded server
-    single_tester = ConcurrentTester(single_host, single_port, "Single-Threaded Server (lab1)")
-    single_time, single_success, single_times = single_tester.test_concurrent_requests(
-        resource=resource, 
-        num_requests=num_requests
-    )
-    
+    single_tester = ConcurrentTester(single_host, single_port, "Single-Threaded Server (lab1)", keep_alive)
+    single = single_tester.test_concurrent_requests(resource=resource, num_requests=num_requests, **options)
+
     # Wait a bit between tests
     time.sleep(2)
-    
+
     # Test multi-threaded server
-    multi_tester = ConcurrentTester(multi_host, multi_port, "Multi-Threaded Server (Concurrent)")
-    multi_time, multi_success, multi_times = multi_tester.test_concurrent_requests(
-        resource=resource,
-        num_requests=num_requests
-    )
-    
+    multi_tester = ConcurrentTester(multi_host, multi_port, "Multi-Threaded Server (Concurrent)", keep_alive)
+    multi = multi_tester.test_concurrent_requests(resource=resource, num_requests=num_requests, **options)
+
     # Print comparison
     print(f"\n{'='*70}")
     print("PERFORMANCE COMPARISON")
     print(f"{'='*70}\n")
-    
+
     print(f"{'Metric':<30} {'Single-Threaded':<20} {'Multi-Threaded':<20}")
     print("-" * 70)
-    print(f"{'Total Time':<30} {single_time:.3f}s{'':<14} {multi_time:.3f}s")
-    print(f"{'Average Response Time':<30} {sum(single_times)/len(single_times):.3f}s{'':<14} {sum(multi_times)/len(multi_times):.3f}s")
-    print(f"{'Min Response Time':<30} {min(single_times):.3f}s{'':<14} {min(multi_times):.3f}s")
-    print(f"{'Max Response Time':<30} {max(single_times):.3f}s{'':<14} {max(multi_times):.3f}s")
-    print(f"{'Throughput':<30} {num_requests/single_time:.2f} req/s{'':<11} {num_requests/multi_time:.2f} req/s")
-    print(f"{'Successful Requests':<30} {single_success}/{num_requests}{'':<14} {multi_success}/{num_requests}")
-    
-    # Calculate speedup
-    if single_time > 0 and multi_time > 0:
-        speedup = single_time / multi_time
+    print(f"{'Measured Time':<30} {single['elapsed_sec']:<20.3f} {multi['elapsed_sec']:.3f}s")
+    print(f"{'Throughput (req/s)':<30} {single['throughput_rps']:<20.2f} {multi['throughput_rps']:.2f}")
+    for key in single["latency"]:
+        if key.endswith("_ms"):
+            label = f"Latency {key[:-3]} (ms)"
+            print(f"{label:<30} {single['latency'][key]:<20.2f} {multi['latency'][key]:.2f}")
+    print(f"{'Successful Requests':<30} {str(single['ok']) + '/' + str(single['requests']):<20} {multi['ok']}/{multi['requests']}")
+
+    # Throughput and p99 tell different stories under load, so show both
+    if single["throughput_rps"] > 0 and multi["throughput_rps"] > 0:
+        speedup = multi["throughput_rps"] / single["throughput_rps"]
         print(f"\n{'='*70}")
         if speedup > 1:
-            print(f"Multi-threaded server is {speedup:.2f}x FASTER than single-threaded")
+            print(f"Multi-threaded server has {speedup:.2f}x the throughput of single-threaded")
         elif speedup < 1:
-            print(f"Single-threaded server is {1/speedup:.2f}x FASTER than multi-threaded")
+            print(f"Single-threaded server has {1/speedup:.2f}x the throughput of multi-threaded")
         else:
-            print(f"Both servers have similar performance")
-        print(f"Time saved: {abs(single_time - multi_time):.3f}s ({abs(single_time - multi_time)/single_time*100:.1f}%)")
+            print("Both servers have similar performance")
+        if single["latency"]["p99_ms"] > 0 and multi["latency"]["p99_ms"] > 0:
+            print(f"p99 latency: {single['latency']['p99_ms']:.2f}ms vs {multi['latency']['p99_ms']:.2f}ms")
         print(f"{'='*70}\n")
+    return {"single": single, "multi": multi}
+
+
+def _address(value: str) -> Tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "localhost", int(port)
 
 
 def main():
     """Main function to run concurrent tests."""
-    
+
     # Default configuration for your servers
     SINGLE_THREADED_HOST = "localhost"
     SINGLE_THREADED_PORT = 2222
-    
+
     MULTI_THREADED_HOST = "localhost"
     MULTI_THREADED_PORT = 3333
-    
-    # Parse command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["-h", "--help"]:
-            print("Usage: python test_concurrent.py [resource] [num_requests]")
-            print("\nDefault servers:")
-            print(f"  Single-threaded: http://{SINGLE_THREADED_HOST}:{SINGLE_THREADED_PORT}/")
-            print(f"  Multi-threaded:  http://{MULTI_THREADED_HOST}:{MULTI_THREADED_PORT}/")
-            print("\nExamples:")
-            print("  python test_concurrent.py")
-            print("  python test_concurrent.py '' 10")
-            print("  python test_concurrent.py 'images' 20")
-            sys.exit(0)
-    
-    resource = sys.argv[1] if len(sys.argv) > 1 else ""
-    num_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-    
-    # Run comparison test
-    compare_servers(
-        SINGLE_THREADED_HOST,
-        SINGLE_THREADED_PORT,
-        MULTI_THREADED_HOST,
-        MULTI_THREADED_PORT,
-        resource=resource,
-        num_requests=num_requests
+
+    parser = argparse.ArgumentParser(
+        description="Load-test the lab servers and compare their throughput and latency percentiles.",
+        epilog="Examples:\n"
+               "  python performance.py '' 10\n"
+               "  python performance.py images -c 20 -d 10 -w 2\n"
+               "  python performance.py -c 50 -r 200 -d 30 --json results.json\n"
+               "  python performance.py --target localhost:8080 -c 8 -d 5",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
     )
+    parser.add_argument("resource", nargs="?", default="", help="path to request (default: root)")
+    parser.add_argument("num_requests", nargs="?", type=int, help="measured requests per server (default: 10, or unlimited with --duration)")
+    parser.add_argument("-c", "--connections", type=int, help="concurrent connections (default: num_requests, or 10)")
+    parser.add_argument("-d", "--duration", type=float, help="measure for this many seconds")
+    parser.add_argument("-w", "--warmup", type=float, default=0.0, help="seconds of unmeasured load first (default: 0)")
+    parser.add_argument("-r", "--rate", type=float, help="open loop: requests/second at a constant arrival rate")
+    parser.add_argument("--no-keepalive", action="store_true", help="open a new connection for every request")
+    parser.add_argument("--json", nargs="?", const="-", metavar="FILE", help="write results as JSON to FILE, or stdout")
+    parser.add_argument("--single", type=_address, default=(SINGLE_THREADED_HOST, SINGLE_THREADED_PORT), metavar="HOST:PORT")
+    parser.add_argument("--multi", type=_address, default=(MULTI_THREADED_HOST, MULTI_THREADED_PORT), metavar="HOST:PORT")
+    parser.add_argument("--target", type=_address, metavar="HOST:PORT", help="test only this server instead of comparing two")
+    args = parser.parse_intermixed_args()
+
+    num_requests = args.num_requests
+    if num_requests is None and args.duration is None:
+        num_requests = 10
+    connections = args.connections or num_requests or 10
+    options = {"num_workers": connections, "duration": args.duration, "warmup": args.warmup, "rate": args.rate}
+
+    # With JSON on stdout the human-readable report goes to stderr
+    report = sys.stderr if args.json == "-" else sys.stdout
+    with contextlib.redirect_stdout(report):
+        if args.target:
+            tester = ConcurrentTester(*args.target, f"Server at {args.target[0]}:{args.target[1]}", not args.no_keepalive)
+            results = tester.test_concurrent_requests(args.resource, num_requests, **options)
+        else:
+            results = compare_servers(
+                *args.single,
+                *args.multi,
+                resource=args.resource,
+                num_requests=num_requests,
+                keep_alive=not args.no_keepalive,
+                **options,
+            )
+
+    if args.json == "-":
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class RateLimiter:
+    """GCRA (token bucket) limiter keeping one float per client key.
+
+    ``limit`` requests are allowed per ``window`` seconds, as a burst or
+    spread out. Keys whose bucket has fully refilled carry no information
+    and are evicted by a background sweeper.
+
+    Rules tighten the limit for matching paths: ``"/img/*=20/1"`` applies
+    to every path under ``/img/``, ``"/README.md=2/1"`` to that path only.
+    """
+
+    def __init__(self, limit: int, window: float, rules: str = "", sweep_interval: float = 30.0):
+        self.limit = limit
+        self.window = window
+        self.sweep_interval = sweep_interval
+        self.exact_rules: Dict[str, Tuple[int, float]] = {}
+        self.prefix_rules: List[Tuple[str, int, float]] = []
+        for rule in filter(None, (r.strip() for r in rules.split(","))):
+            path, _, spec = rule.rpartition("=")
+            count, _, per = spec.partition("/")
+            if not path or not count:
+                raise ValueError(f"Invalid rate rule '{rule}' (expected PATH=LIMIT/WINDOW)")
+            rule_limit, rule_window = int(count), float(per or 1.0)
+            if path.endswith("*"):
+                self.prefix_rules.append((path[:-1], rule_limit, rule_window))
+            else:
+                self.exact_rules[path] = (rule_limit, rule_window)
+        # Longest prefix first, so the most specific rule wins
+        self.prefix_rules.sort(key=lambda r: len(r[0]), reverse=True)
+
+        # Theoretical arrival time per (ip, scope) key
+        self._tat: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+
+        self.rejected = 0
+        self.evicted = 0
+
+    def _consume(self, key: Tuple[str, str], limit: int, window: float) -> bool:
+        if limit <= 0:
+            return True
+        interval = window / limit
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            if tat - now > window - interval:
+                self.rejected += 1
+                return False
+            self._tat[key] = tat + interval
+            return True
+
+    def allow(self, ip: str) -> bool:
+        return self._consume((ip, ""), self.limit, self.window)
+
+    def allow_path(self, ip: str, path: str) -> bool:
+        rule = self.exact_rules.get(path)
+        if rule is not None:
+            return self._consume((ip, "=" + path), *rule)
+        for prefix, limit, window in self.prefix_rules:
+            if path.startswith(prefix):
+                return self._consume((ip, prefix), limit, window)
+        return True
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, tat in self._tat.items() if tat <= now]
+            for key in idle:
+                del self._tat[key]
+            self.evicted += len(idle)
+        return len(idle)
+
+    def start(self):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._sweeper = threading.Thread(target=self._sweep_forever, name="rate-limit-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._tat), "rejected": self.rejected, "evicted": self.evicted}
@@ -1,15 +1,332 @@
 #!/usr/bin/env python3
+import asyncio
+import base64
+import bisect
+import email.utils
+import html
+import json
 import socket
 import os
 import sys
 import mimetypes
+import multiprocessing
+import multiprocessing.connection
+import secrets
+import select
+import signal
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import unquote
+from multiprocessing.managers import BaseManager
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote, urlencode
 from typing import Dict, Deque, Tuple
 
+from access_log import AccessLog
+from archive import tar_stream
+from compression import Compressor, compress, compress_stream, fresh_sidecar, is_compressible, negotiate
+from content_cache import ContentCache
+from counts_journal import CountJournal
+from fsindex import FileIndex
+from http_parser import HTTPRequest, RequestParser
+from metrics import Metrics, merge_reports
+from path_cache import PathCache, PathInfo
+from ratelimit import RateLimiter
+from worker_pool import ElasticPool, worker_slot
+
+
+# Range requests asking for more parts than this get the whole file instead
+MAX_RANGES = 16
+# Number of rendered directory skeletons kept in memory
+LISTING_CACHE_SIZE = 256
+# Prometheus scrape endpoint; not a file path, so it is never counted
+METRICS_PATH = "/__metrics"
+# Most results returned by a /?q= filename search
+SEARCH_LIMIT = 200
+# Largest page a listing request may ask for with ?limit=
+LISTING_MAX_LIMIT = 10000
+LISTING_SORTS = ("name", "size", "mtime", "requests")
+# Streamed bodies are written (and chunk-framed) in pieces of about this size
+STREAM_CHUNK_SIZE = 64 * 1024
+# ?archive= formats a directory can be downloaded as
+ARCHIVE_FORMATS = {"tar": ("application/x-tar", ".tar"), "tgz": ("application/gzip", ".tar.gz")}
+# Seconds between batches of counter increments sent to the coordinator
+COUNTS_SYNC_INTERVAL = 0.1
+# Seconds between metrics reports each worker sends to the coordinator
+METRICS_SYNC_INTERVAL = 1.0
+# How often an idle keep-alive connection checks whether others are queued
+IDLE_CHECK_INTERVAL = 0.05
+
+# Shared by directory listings and search results
+_PAGE_STYLE = [
+    "<style>",
+    "body { font-family: Arial, sans-serif; margin: 40px; background: #f5f5f5; }",
+    ".container { background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }",
+    "h1 { color: #333; margin-top: 0; }",
+    "ul { list-style: none; padding: 0; }",
+    "li { padding: 12px; border-bottom: 1px solid #eee; transition: background 0.2s; }",
+    "li:hover { background: #f9f9f9; }",
+    "a { text-decoration: none; color: #0066cc; }",
+    "a:hover { text-decoration: underline; }",
+    ".dir { font-weight: bold; color: #d97706; }",
+    '.dir:before { content: "📁 "; }',
+    '.file:before { content: "📄 "; }',
+    '.parent:before { content: "⬆️ "; }',
+    "footer { margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; color: #666; font-size: 14px; }",
+    "</style>",
+]
+
+
+class _TimingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            return {"count": self.count, "avg_sec": avg, "max_sec": self.max}
+
+
+class _CounterShard:
+    __slots__ = ("counts", "lock", "dirty")
+
+    def __init__(self, dirty: set | None = None):
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        # Paths incremented since the journal's last flush; None without a journal
+        self.dirty = dirty
+
+
+class _DirectoryListing:
+    # Rendered page for one directory with the request counters cut out;
+    # valid as long as the directory's mtime and inode are unchanged.
+    # Entries are in name order; `orders` caches other sort orders.
+    __slots__ = ("mtime_ns", "ino", "mtime", "head", "keys", "prefixes", "tail", "names", "dirs", "stats", "stats_at", "orders")
+
+    def __init__(self, mtime_ns, ino, mtime, head, keys, prefixes, tail, names, dirs):
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+        self.mtime = mtime
+        self.head = head
+        self.keys = keys
+        self.prefixes = prefixes
+        self.tail = tail
+        self.names = names
+        self.dirs = dirs
+        # (size, mtime) per entry, only gathered when a sort needs them
+        self.stats = None
+        self.stats_at = 0.0
+        self.orders: Dict[str, list] = {}
+
+
+class _ResponseBuffer:
+    """Socket stand-in used by the async engine: collects what the handlers
+    send so the event loop can write it out without blocking."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def sendall(self, data: bytes):
+        self._chunks.append(bytes(data))
+
+    def sendmsg(self, buffers) -> int:
+        total = 0
+        for buf in buffers:
+            self._chunks.append(bytes(buf))
+            total += len(buf)
+        return total
+
+    def sendfile(self, file, offset: int = 0, count: int | None = None) -> int:
+        # The handler closes its file when it returns, so keep a duplicate
+        # descriptor open until the loop has streamed the range.
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+        self._chunks.append((os.fdopen(os.dup(file.fileno()), "rb"), offset, count))
+        return count
+
+    def stream(self, pieces):
+        # A generator body: produced lazily while the loop writes it out
+        self._chunks.append(pieces)
+
+    async def flush(self, writer: asyncio.StreamWriter):
+        # Generator bodies read files and compress: their pieces are made on
+        # the loop's executor so other connections keep being served
+        loop = asyncio.get_running_loop()
+        try:
+            for chunk in self._chunks:
+                if isinstance(chunk, tuple):
+                    file, offset, count = chunk
+                    await writer.drain()
+                    await loop.sendfile(writer.transport, file, offset, count)
+                elif isinstance(chunk, bytes):
+                    writer.write(chunk)
+                    await writer.drain()
+                else:
+                    # One piece at a time, so a slow client holds at most
+                    # one piece of a streamed body in memory
+                    while True:
+                        piece = await loop.run_in_executor(None, next, chunk, None)
+                        if piece is None:
+                            break
+                        writer.write(piece)
+                        await writer.drain()
+        finally:
+            for chunk in self._chunks:
+                if isinstance(chunk, tuple):
+                    chunk[0].close()
+                elif not isinstance(chunk, bytes):
+                    chunk.close()
+            self._chunks.clear()
+
+
+class _CountStore:
+    # Lives in the coordinator process when PROCESSES > 1; every worker
+    # process talks to the same instance through a manager proxy.
+    def __init__(self, journal_path: str = "", flush_interval: float = 1.0):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Paths incremented since the journal's last flush
+        self._dirty: set = set()
+        # Latest metrics report per worker slot as (pid, report), and the
+        # counters of replaced workers, so the totals never go backwards
+        self._reports: Dict[int, tuple] = {}
+        self._retired = None
+        # The coordinator owns the counters, so it also persists them
+        self._journal = None
+        if journal_path:
+            self._journal = CountJournal(journal_path, flush_interval)
+            self._counts = self._journal.load()
+            self._journal.start(self.changed)
+
+    def add_many(self, deltas: Dict[str, int]):
+        with self._lock:
+            self._add(deltas)
+
+    def get_many(self, rel_paths, deltas: Dict[str, int] | None = None):
+        # The caller's unsent increments are applied in the same round trip
+        with self._lock:
+            self._add(deltas)
+            return [self._counts.get(rel_path, 0) for rel_path in rel_paths]
+
+    def changed(self) -> Dict[str, int]:
+        # Journal flush: only the paths incremented since the previous call
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            counts = self._counts
+            return {rel_path: counts[rel_path] for rel_path in dirty}
+
+    def _add(self, deltas: Dict[str, int] | None):
+        # Caller holds the lock
+        if deltas:
+            counts = self._counts
+            for rel_path, delta in deltas.items():
+                counts[rel_path] = counts.get(rel_path, 0) + delta
+            if self._journal is not None:
+                self._dirty.update(deltas)
+
+    def size(self) -> int:
+        return len(self._counts)
+
+    def publish_metrics(self, slot: int, pid: int, report: Dict[str, object]):
+        with self._lock:
+            previous = self._reports.get(slot)
+            if previous is not None and previous[0] != pid:
+                # The slot's worker was restarted: keep what the old one counted
+                old = [previous[1]] + ([self._retired] if self._retired is not None else [])
+                self._retired = merge_reports(old, counters_only=True)
+            self._reports[slot] = (pid, report)
+
+    def merged_metrics(self, slot: int, pid: int, report: Dict[str, object]) -> Dict[str, object]:
+        # The scraped worker's own report is current; the others are at most
+        # METRICS_SYNC_INTERVAL old
+        self.publish_metrics(slot, pid, report)
+        with self._lock:
+            reports = [report for _, report in self._reports.values()]
+            if self._retired is not None:
+                reports.append(self._retired)
+        return merge_reports(reports)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.stop()
+
+
+class _CountBatcher:
+    """Worker-side buffer in front of the coordinator's _CountStore.
+
+    Increments go into a local dict, and a background thread ships them in
+    one ``add_many`` call every ``interval`` seconds, so a request never
+    waits on the coordinator. Reads carry the unsent increments along, so a
+    worker always sees its own requests and its counts never go backwards.
+    Other workers' increments show up within ``interval``.
+    """
+
+    def __init__(self, store, interval: float = COUNTS_SYNC_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._pending: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        # Held around every round trip that carries increments, so batches
+        # reach the coordinator in the order they were taken
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._flush_forever, name="counts-sync", daemon=True)
+        self._thread.start()
+
+    def increment(self, rel_path: str):
+        with self._pending_lock:
+            self._pending[rel_path] = self._pending.get(rel_path, 0) + 1
+
+    def _take(self) -> Dict[str, int]:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def get_many(self, rel_paths) -> list:
+        with self._send_lock:
+            return self.store.get_many(list(rel_paths), self._take())
+
+    def flush(self):
+        with self._send_lock:
+            pending = self._take()
+            if pending:
+                self.store.add_many(pending)
+
+    def _flush_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except (OSError, EOFError) as e:
+                # Coordinator gone (shutting down); nothing left to send to
+                print(f"✗ Counter sync failed: {e}")
+                return
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+class _CountManager(BaseManager):
+    pass
+
+
+_CountManager.register("CountStore", _CountStore)
+
 
 class HTTPServerLab2:
     def __init__(
@@ -19,32 +336,127 @@ class HTTPServerLab2:
         port: int = 8080,
         auto_port: bool = True,
         workers: int = 32,
+        queue_size: int = 128,
+        min_workers: int = 8,
+        pool_grow_wait: float = 0.05,
+        pool_cooldown: float = 30.0,
         delay_sec: float = 1.0,
         counter_mode: str = "locked",
         rate_limit: int = 5,
         rate_window: float = 1.0,
+        rate_rules: str = "",
+        engine: str = "threads",
+        keepalive_timeout: float = 5.0,
+        max_keepalive_requests: int = 100,
+        sendfile_threshold: int = 64 * 1024,
+        processes: int = 1,
+        reuse_port: bool = False,
+        cache_bytes: int = 64 * 1024 * 1024,
+        cache_max_object: int = 1024 * 1024,
+        access_log: str = "common",
+        access_log_sample: float = 1.0,
+        access_log_queue: int = 65536,
+        compress_responses: bool = True,
+        compress_level: int = 6,
+        compress_min_size: int = 256,
+        compress_cache_bytes: int = 16 * 1024 * 1024,
+        counts_file: str = "",
+        counts_flush_interval: float = 1.0,
+        path_cache_ttl: float = 1.0,
+        path_cache_size: int = 4096,
+        file_index: bool = True,
+        file_index_poll: float = 5.0,
+        listing_page_size: int = 1000,
+        stream_min_entries: int = 2000,
+        archives: bool = True,
     ):
         self.directory = os.path.abspath(directory)
+        # Resolved paths must start with this to be inside the served tree
+        self._root_prefix = self.directory.rstrip(os.sep) + os.sep
         self.host = host
         self.port = port
         self.auto_port = auto_port
         self.socket: socket.socket | None = None
 
         # Concurrency & behavior settings
+        # The pool grows from `min_workers` up to `workers` threads with load
         self.workers = workers
+        self.min_workers = min(min_workers, workers)
+        self.pool_grow_wait = pool_grow_wait
+        self.pool_cooldown = pool_cooldown
+        self.pool: ElasticPool | None = None
+        self.queue_size = queue_size
         self.delay_sec = delay_sec
         self.counter_mode = counter_mode.lower()
         self.rate_limit = rate_limit
         self.rate_window = rate_window
+        self.engine = engine.lower()
+        self.keepalive_timeout = keepalive_timeout
+        self.max_keepalive_requests = max_keepalive_requests
+        self.sendfile_threshold = sendfile_threshold
+        self.processes = max(1, processes)
+        self.reuse_port = reuse_port and hasattr(socket, "SO_REUSEPORT")
 
         # Shared state
         self._counts: Dict[str, int] = {}
         self._counts_lock = threading.Lock()
-        self._rate_map: Dict[str, Deque[float]] = {}
-        self._rate_lock = threading.Lock()
+        # Paths incremented since the journal's last flush; None without a journal
+        self._dirty: set | None = None
+        # Per-thread shards for COUNTER_MODE=sharded, merged on read. Pool
+        # threads share one per slot, so retired threads leave none behind.
+        self._shards: list = []
+        self._slot_shards: Dict[int, _CounterShard] = {}
+        self._shards_lock = threading.Lock()
+        self._shard_local = threading.local()
+        # Proxy to the coordinator's _CountStore in multi-process mode, and
+        # in each worker the batcher that sends it the increments
+        self._shared_counts = None
+        self._count_batcher: _CountBatcher | None = None
+        self._worker_slot = 0
+        # Write-behind persistence of the counters; empty path keeps them in memory only
+        self.counts_file = counts_file
+        self.counts_flush_interval = counts_flush_interval
+        self.journal: CountJournal | None = None
+        self.rate_limiter = RateLimiter(rate_limit, rate_window, rate_rules)
+        # Admission control: at most `workers` connections in service plus
+        # `queue_size` waiting; anything beyond that is shed with a 503.
+        self._admission = threading.BoundedSemaphore(workers + queue_size)
+        self._queue_lock = threading.Lock()
+        self._queued = 0
+        self._shed = 0
+        self._queue_wait = _TimingStats()
+        self._service_time = _TimingStats()
+        self._listings: Dict[Tuple[str, str], _DirectoryListing] = {}
+        self._listings_lock = threading.Lock()
+        # Entries per listing page unless ?limit= asks otherwise
+        self.listing_page_size = max(1, listing_page_size)
+        # Listing pages this long are streamed instead of joined in memory
+        self.stream_min_entries = stream_min_entries
+        self.archives = archives
+        # Small hot files are kept in memory; 0 bytes disables the cache
+        self.cache = ContentCache(cache_bytes, cache_max_object) if cache_bytes > 0 else None
+        # Written by a background thread; "off" disables the access log
+        access_log = access_log.lower()
+        if access_log != "off" and access_log not in AccessLog.FORMATS:
+            raise ValueError(f"Unknown access log format '{access_log}' (expected 'common', 'json' or 'off')")
+        self.access_log = AccessLog(fmt=access_log, sample=access_log_sample, max_queue=access_log_queue) if access_log != "off" else None
+        self.metrics = Metrics()
+        # URL path -> resolved path and stat result, trusted for a short TTL
+        self.path_cache = PathCache(path_cache_ttl, path_cache_size)
+        # In-memory index of the tree: filename search and 404s without a stat
+        self.file_index = FileIndex(self.directory, file_index_poll) if file_index else None
+        # gzip/deflate variants of text files, cached by file identity
+        self.compressor = (
+            Compressor(compress_level, compress_min_size, max(cache_max_object, 1024 * 1024), compress_cache_bytes)
+            if compress_responses else None
+        )
 
         if not os.path.isdir(self.directory):
             raise ValueError(f"Directory '{directory}' does not exist")
+        if self.counter_mode not in ("locked", "naive", "sharded"):
+            raise ValueError(f"Unknown counter mode '{counter_mode}' (expected 'locked', 'naive' or 'sharded')")
+        if self.engine not in ("threads", "async"):
+            raise ValueError(f"Unknown engine '{engine}' (expected 'threads' or 'async')")
 
     #  Port utils 
     def find_available_port(self, start_port, max_attempts=100):
@@ -62,25 +474,57 @@ class HTTPServerLab2:
         )
 
     #  Rate limiting 
-    def _allow_request(self, ip: str) -> bool:
-        now = time.monotonic()
-        with self._rate_lock:
-            dq = self._rate_map.get(ip)
-            if dq is None:
-                dq = deque()
-                self._rate_map[ip] = dq
-            cutoff = now - self.rate_window
-            while dq and dq[0] < cutoff:
-                dq.popleft()
-            if len(dq) >= self.rate_limit:
-                return False
-            dq.append(now)
-            return True
+    def _allow_request(self, ip: str, path: str | None = None, admitted: bool = False) -> bool:
+        # `admitted`: the per-IP bucket was already charged when the
+        # connection was accepted, only path rules are left to check
+        if not admitted and not self.rate_limiter.allow(ip):
+            return False
+        return path is None or self.rate_limiter.allow_path(ip, path)
+
+    def _reject_at_accept(self, client_socket: socket.socket, code=429, text="Too Many Requests", body=b"Rate limit exceeded\n", extra_headers=None):
+        # Answered from the accept thread, so a rejected client never takes a
+        # pool worker. The response fits in an empty send buffer.
+        try:
+            client_socket.settimeout(0)
+            self._send_response(client_socket, code, text, "text/plain", body, extra_headers=extra_headers)
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "cache": self.cache.stats() if self.cache is not None else {},
+            "rate_limit": self.rate_limiter.stats(),
+            "admission": {
+                "queued": self._queued,
+                "capacity": self.workers + self.queue_size,
+                "shed": self._shed,
+            },
+            "pool": self.pool.stats() if self.pool is not None else {},
+            "queue_wait": self._queue_wait.snapshot(),
+            "service_time": self._service_time.snapshot(),
+            "access_log": self.access_log.stats() if self.access_log is not None else {},
+            "compression": self.compressor.stats() if self.compressor is not None else {},
+            "counts_journal": self.journal.stats() if self.journal is not None else {},
+            "path_cache": self.path_cache.stats(),
+            "file_index": self.file_index.stats() if self.file_index is not None else {},
+        }
+
+    def _start_background_tasks(self):
+        # Called in each serving process (threads do not survive fork)
+        self.rate_limiter.start()
+        if self.access_log is not None:
+            self.access_log.start()
+        if self.file_index is not None:
+            self.file_index.start()
 
     #Counters 
     def _increment_count_locked(self, rel_path: str):
         with self._counts_lock:
             self._counts[rel_path] = self._counts.get(rel_path, 0) + 1
+            if self._dirty is not None:
+                self._dirty.add(rel_path)
 
     def _increment_count_naive(self, rel_path: str):
         # Intentionally racy, with tiny sleep to increase interleaving
@@ -88,21 +532,109 @@ class HTTPServerLab2:
             self._counts[rel_path] = 0
             time.sleep(0.001)
         self._counts[rel_path] += 1
+        if self._dirty is not None:
+            self._dirty.add(rel_path)
+
+    def _increment_count_sharded(self, rel_path: str):
+        # Each thread owns a shard, so its lock is only ever contended by a
+        # reader taking a snapshot, never by other request threads.
+        shard = getattr(self._shard_local, "shard", None)
+        if shard is None:
+            slot = worker_slot()
+            with self._shards_lock:
+                shard = self._slot_shards.get(slot) if slot is not None else None
+                if shard is None:
+                    shard = _CounterShard(set() if self._dirty is not None else None)
+                    self._shards.append(shard)
+                    if slot is not None:
+                        self._slot_shards[slot] = shard
+            self._shard_local.shard = shard
+        with shard.lock:
+            shard.counts[rel_path] = shard.counts.get(rel_path, 0) + 1
+            if shard.dirty is not None:
+                shard.dirty.add(rel_path)
+
+    def _sharded_counts(self, rel_paths) -> list:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # Holding every shard lock at once gives a consistent cut; writers
+        # only ever hold their own lock, so the fixed order cannot deadlock.
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            return [sum(shard.counts.get(rel_path, 0) for shard in shards) for rel_path in rel_paths]
+        finally:
+            for shard in shards:
+                shard.lock.release()
 
     def _increment_count(self, rel_path: str):
-        if self.counter_mode == "naive":
+        if self._count_batcher is not None:
+            self._count_batcher.increment(rel_path)
+        elif self.counter_mode == "naive":
             self._increment_count_naive(rel_path)
+        elif self.counter_mode == "sharded":
+            self._increment_count_sharded(rel_path)
         else:
             self._increment_count_locked(rel_path)
 
     def _get_count(self, rel_path: str) -> int:
+        return self._get_counts([rel_path])[0]
+
+    def _get_counts(self, rel_paths) -> list:
+        # Snapshot read: all requested counts come from one consistent view
+        # (one lock acquisition, one shard sweep or one coordinator round trip).
+        if self._count_batcher is not None:
+            return self._count_batcher.get_many(rel_paths)
+        if self.counter_mode == "sharded":
+            return self._sharded_counts(rel_paths)
+        with self._counts_lock:
+            return [self._counts.get(rel_path, 0) for rel_path in rel_paths]
+
+    def _changed_counts(self) -> Dict[str, int]:
+        # Journal flush: current totals of the paths incremented since the
+        # previous call. The locks are held only for the dirty paths.
+        if self.counter_mode == "sharded":
+            with self._shards_lock:
+                shards = list(self._shards)
+            for shard in shards:
+                shard.lock.acquire()
+            try:
+                dirty = set()
+                for shard in shards:
+                    if shard.dirty:
+                        dirty.update(shard.dirty)
+                        shard.dirty = set()
+                return {rel_path: sum(shard.counts.get(rel_path, 0) for shard in shards) for rel_path in dirty}
+            finally:
+                for shard in shards:
+                    shard.lock.release()
         with self._counts_lock:
-            return self._counts.get(rel_path, 0)
+            dirty, self._dirty = self._dirty, set()
+            counts = self._counts
+            return {rel_path: counts[rel_path] for rel_path in dirty}
+
+    def _restore_counts(self, counts: Dict[str, int]):
+        if self.counter_mode == "sharded":
+            # Restored totals become one more shard that nobody writes to
+            shard = _CounterShard()
+            shard.counts = counts
+            with self._shards_lock:
+                self._shards.append(shard)
+        else:
+            with self._counts_lock:
+                self._counts.update(counts)
 
     # -------------------- Server loop --------------------
+    def _new_listen_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # Each worker process binds its own socket; the kernel balances accepts
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return sock
+
     def start(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket = self._new_listen_socket()
 
         original_port = self.port
         bind_successful = False
@@ -115,8 +647,7 @@ class HTTPServerLab2:
                 print(f"Port {self.port} is already in use, searching for available port...")
                 self.port = self.find_available_port(self.port + 1)
                 self.socket.close()
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.socket = self._new_listen_socket()
                 self.socket.bind((self.host, self.port))
                 bind_successful = True
                 print(f"✓ Found available port: {self.port}")
@@ -135,159 +666,940 @@ class HTTPServerLab2:
         print(f" Serving files from: {self.directory}")
         if self.port != original_port:
             print(f"  Note: Port {original_port} was in use, using {self.port} instead")
-        print(f" Workers: {self.workers}, Delay: {self.delay_sec}s, Counter: {self.counter_mode}, Rate: {self.rate_limit}/s")
+        if self.processes > 1:
+            print(f" Processes: {self.processes} ({'SO_REUSEPORT' if self.reuse_port else 'shared socket'})")
+        print(f" Engine: {self.engine}, Workers: {self.min_workers}-{self.workers}, Queue: {self.queue_size}, Delay: {self.delay_sec}s, Counter: {self.counter_mode}, Rate: {self.rate_limit}/s")
+        if self.counts_file and self.processes == 1:
+            # Multi-process mode restores and persists in the coordinator instead
+            self.journal = CountJournal(self.counts_file, self.counts_flush_interval)
+            restored = self.journal.load()
+            self._restore_counts(restored)
+            print(f" Counters: {len(restored)} paths restored from {self.counts_file}")
+            self._dirty = set()
+            self.journal.start(self._changed_counts)
+            if threading.current_thread() is threading.main_thread():
+                # `docker stop` sends SIGTERM: leave through the finally below
+                # so the last increments are flushed.
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if self.file_index is not None:
+            # Built before forking, so worker processes share the pages
+            self.file_index.build()
+            print(f" Index: {self.file_index.entries} entries in {self.file_index.build_sec:.2f}s")
         print(f"{'='*60}")
         print("Press Ctrl+C to stop the server\n")
 
         try:
-            with ThreadPoolExecutor(max_workers=self.workers) as pool:
-                while True:
-                    client_socket, client_address = self.socket.accept()
-                    # submit handling to pool
-                    pool.submit(self._handle_client, client_socket, client_address)
+            if self.processes > 1:
+                self._serve_processes()
+            elif self.engine == "async":
+                asyncio.run(self._serve_async())
+            else:
+                self._serve_threads()
         except KeyboardInterrupt:
             print("\n\n Shutting down server...")
+            if self.cache is not None and self.processes == 1:
+                print(f" Cache: {self.cache.stats()}")
         finally:
             if self.socket:
                 self.socket.close()
+            if self.access_log is not None:
+                self.access_log.stop()
+            if self.journal is not None:
+                self.journal.stop()
             print("✓ Server stopped")
 
-    #Request handling 
-    def _handle_client(self, client_socket: socket.socket, client_address: Tuple[str, int]):
+    def _serve_threads(self):
+        self._start_background_tasks()
+        self.pool = ElasticPool(self.min_workers, self.workers, self.pool_grow_wait, cooldown=self.pool_cooldown)
+        self.pool.start()
         try:
-            ip, _ = client_address
-            if not self._allow_request(ip):
-                self._send_response(client_socket, 429, "Too Many Requests", "text/plain", b"Rate limit exceeded\n")
-                return
+            while True:
+                client_socket, client_address = self.socket.accept()
+                if not self._allow_request(client_address[0]):
+                    self._reject_at_accept(client_socket)
+                    continue
+                if not self._admission.acquire(blocking=False):
+                    # Overloaded: fail fast instead of letting the socket rot in the queue
+                    self._shed += 1
+                    self._reject_at_accept(
+                        client_socket, 503, "Service Unavailable", b"Server busy, retry later\n", ["Retry-After: 1"]
+                    )
+                    continue
+                with self._queue_lock:
+                    self._queued += 1
+                # submit handling to pool
+                self.pool.submit(self._run_admitted, client_socket, client_address, time.monotonic())
+        finally:
+            self.pool.shutdown()
 
-            # Artificial delay to simulate work (for concurrency measurement)
-            if self.delay_sec > 0:
-                time.sleep(self.delay_sec)
+    def _run_admitted(self, client_socket: socket.socket, client_address: Tuple[str, int], enqueued_at: float):
+        started_at = time.monotonic()
+        with self._queue_lock:
+            self._queued -= 1
+        self._queue_wait.add(started_at - enqueued_at)
+        # Cleared while the connection sits idle without its admission slot
+        holds_slot = [True]
+        try:
+            self._handle_client(client_socket, client_address, holds_slot)
+        finally:
+            self._service_time.add(time.monotonic() - started_at)
+            if holds_slot[0]:
+                self._admission.release()
 
-            request = client_socket.recv(4096).decode("utf-8", errors="ignore")
-            if not request:
-                return
+    def _wait_for_request(self, client_socket: socket.socket, holds_slot: list, can_close: bool) -> bool:
+        """Waits until the connection has bytes to read, without counting
+        against admission while it is idle. False means give up on it: idle
+        timeout, or (``can_close``) another connection waits for a thread."""
+        self._admission.release()
+        holds_slot[0] = False
+        deadline = time.monotonic() + self.keepalive_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([client_socket], [], [], min(remaining, IDLE_CHECK_INTERVAL))
+            if readable:
+                break
+            if can_close and self._queued > 0:
+                # This thread is needed: an idle client can reconnect later
+                return False
+        if not self._admission.acquire(blocking=False):
+            self._shed += 1
+            self._send_response(client_socket, 503, "Service Unavailable", "text/plain", b"Server busy, retry later\n", None, ["Retry-After: 1"])
+            self.metrics.count_response(503, 0)
+            return False
+        holds_slot[0] = True
+        return True
 
-            lines = request.split("\r\n")
-            request_line = lines[0]
-            print(f"Request: {request_line} from {client_address}")
+    def _serve_processes(self):
+        # Pre-fork supervisor: N workers run the normal accept loop, counters
+        # go through a coordinator process so every worker sees the same totals.
+        ctx = multiprocessing.get_context("fork")
+        if self.reuse_port:
+            # Workers open their own SO_REUSEPORT sockets; a listening socket
+            # left in the parent would get connections nobody accepts.
+            self.socket.close()
+            self.socket = None
+        manager = _CountManager(ctx=ctx)
+        # The coordinator never serves HTTP, so it drops its inherited copy of the listener
+        manager.start(self._close_listen_socket)
+        self._shared_counts = manager.CountStore(self.counts_file, self.counts_flush_interval)
+        if self.counts_file:
+            print(f" Counters: {self._shared_counts.size()} paths restored from {self.counts_file}")
 
-            parts = request_line.split()
-            if len(parts) < 2:
-                self.send_response(client_socket, 400, "Bad Request", "text/html")
-                return
+        children: Dict[int, multiprocessing.Process] = {}
+        started_at: Dict[int, float] = {}
+        # `docker stop` sends SIGTERM: unwind through the finally below so
+        # workers and the coordinator are stopped too.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
-            method = parts[0]
-            path = unquote(parts[1])
+        def spawn(slot: int):
+            child = ctx.Process(target=self._worker_main, args=(slot,), name=f"http-worker-{slot}")
+            child.start()
+            children[slot] = child
+            started_at[slot] = time.monotonic()
 
-            if method != "GET":
-                self.send_response(client_socket, 405, "Method Not Allowed", "text/html")
-                return
+        try:
+            for slot in range(self.processes):
+                spawn(slot)
+            while True:
+                multiprocessing.connection.wait([child.sentinel for child in children.values()])
+                for slot, child in list(children.items()):
+                    if child.is_alive():
+                        continue
+                    child.join()
+                    print(f"✗ Worker {slot} (pid {child.pid}) exited with code {child.exitcode}, restarting")
+                    if time.monotonic() - started_at[slot] < 1.0:
+                        # Crashing on startup: back off instead of spinning
+                        time.sleep(1.0)
+                    spawn(slot)
+        finally:
+            for child in children.values():
+                if child.is_alive():
+                    child.terminate()
+            for child in children.values():
+                child.join(timeout=5)
+            self._shared_counts.close()
+            manager.shutdown()
 
-            if path.startswith("/"):
-                path = path[1:]
+    def _close_listen_socket(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
 
-            full_path = os.path.normpath(os.path.join(self.directory, path))
-            if not full_path.startswith(self.directory):
-                self.send_response(client_socket, 403, "Forbidden", "text/html")
-                return
+    def _worker_main(self, slot: int):
+        self._worker_slot = slot
+        self._count_batcher = _CountBatcher(self._shared_counts)
+        self._count_batcher.start()
+        threading.Thread(target=self._publish_metrics_forever, name="metrics-sync", daemon=True).start()
+        # The supervisor stops workers with SIGTERM. Exit from a separate
+        # thread: the handler may interrupt a request holding a counter lock.
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=self._worker_exit).start())
+        if self.reuse_port:
+            self.socket = self._new_listen_socket()
+            self.socket.bind((self.host, self.port))
+            self.socket.listen(128)
+        print(f" Worker {slot} started (pid {os.getpid()})")
+        try:
+            if self.engine == "async":
+                asyncio.run(self._serve_async())
+            else:
+                self._serve_threads()
+        except KeyboardInterrupt:
+            self._worker_exit()
 
-            if not path:
-                full_path = self.directory
+    def _worker_exit(self):
+        # Increments not yet sent to the coordinator are sent before leaving
+        try:
+            self._count_batcher.close()
+        except (OSError, EOFError):
+            pass
+        os._exit(0)
 
-            if not os.path.exists(full_path):
-                self.send_404(client_socket, path)
-                return
+    async def _serve_async(self):
+        # One event loop drives every connection; sockets are non-blocking and
+        # waiting clients cost a coroutine instead of a pool thread. Requests
+        # that may block (stat, file reads, compression, directory walks) run
+        # on up to WORKERS executor threads.
+        self._start_background_tasks()
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(self.workers, thread_name_prefix="http-blocking")
+        )
+        server = await asyncio.start_server(self._handle_client_async, sock=self.socket, backlog=128)
+        async with server:
+            await server.serve_forever()
 
-            if os.path.isdir(full_path):
-                # increment per-directory counter by relative path (count folder visits)
-                rel = os.path.relpath(full_path, self.directory)
-                if rel == '.':
-                    rel = ''
-                self._increment_count(rel)
-                self.serve_directory(client_socket, full_path, path)
-            else:
-                # increment per-file counter by relative path
-                rel = os.path.relpath(full_path, self.directory)
-                self._increment_count(rel)
-                self.serve_file(client_socket, full_path)
+    #Request handling 
+    def _handle_client(self, client_socket: socket.socket, client_address: Tuple[str, int], holds_slot: list | None = None):
+        request = None
+        started = time.monotonic()
+        in_progress = False
+        try:
+            ip, _ = client_address
+            # Idle timeout between requests on a persistent connection
+            client_socket.settimeout(self.keepalive_timeout)
+            parser = RequestParser()
+            pending: Deque[HTTPRequest] = deque()
+            served = 0
+            while True:
+                if not pending:
+                    if parser.error is not None:
+                        self.send_response(client_socket, parser.error.status, parser.error.reason, "text/html")
+                        self.metrics.count_response(parser.error.status, 0)
+                        return
+                    if parser.closed:
+                        return
+                    # Idle connections hand back their admission slot, and
+                    # after a response give way to connections queued for
+                    # a thread
+                    if holds_slot is not None and not self._wait_for_request(client_socket, holds_slot, served > 0):
+                        return
+                    data = client_socket.recv(65536)
+                    if not data:
+                        return
+                    # Several pipelined requests may arrive in one segment
+                    pending.extend(self._feed_parser(parser, data))
+                    continue
+                request = pending.popleft()
+                started = time.monotonic()
+                in_progress = True
+                self.metrics.request_started()
 
+                served += 1
+                if served >= self.max_keepalive_requests or (holds_slot is not None and self._queued > 0):
+                    # Others are waiting for a thread: close after this response
+                    request.keep_alive = False
+
+                if not self._allow_request(ip, request.path, admitted=served == 1):
+                    request.keep_alive = False
+                    self._send_response(client_socket, 429, "Too Many Requests", "text/plain", b"Rate limit exceeded\n", request)
+                    in_progress = False
+                    self._finish_request(ip, request, started, started)
+                    return
+
+                # Artificial delay to simulate work (for concurrency measurement)
+                if self.delay_sec > 0:
+                    time.sleep(self.delay_sec)
+
+                dispatched = time.monotonic()
+                self._process_request(client_socket, request, client_address)
+                in_progress = False
+                self._finish_request(ip, request, started, dispatched)
+                if not request.keep_alive:
+                    return
+
+        except (socket.timeout, ConnectionError):
+            pass
         except Exception as e:
             print(f"Error handling request: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            self.send_response(client_socket, 500, "Internal Server Error", "text/html", request)
+            if in_progress:
+                in_progress = False
+                self._finish_request(client_address[0], request, started, started)
         finally:
+            if in_progress:
+                self.metrics.request_abandoned()
             try:
                 client_socket.shutdown(socket.SHUT_RDWR)
             except Exception:
                 pass
             client_socket.close()
 
+    async def _handle_client_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client_address = writer.get_extra_info("peername")[:2]
+        ip, _ = client_address
+        served = 0
+        in_progress = False
+        try:
+            if not self._allow_request(ip):
+                # Reject before reading anything, like the threads engine's accept loop
+                response = _ResponseBuffer()
+                self._send_response(response, 429, "Too Many Requests", "text/plain", b"Rate limit exceeded\n")
+                await response.flush(writer)
+                return
+            parser = RequestParser()
+            pending: Deque[HTTPRequest] = deque()
+            while True:
+                if not pending:
+                    if parser.error is not None:
+                        response = _ResponseBuffer()
+                        self.send_response(response, parser.error.status, parser.error.reason, "text/html")
+                        self.metrics.count_response(parser.error.status, 0)
+                        await response.flush(writer)
+                        return
+                    if parser.closed:
+                        return
+                    try:
+                        data = await asyncio.wait_for(reader.read(65536), self.keepalive_timeout)
+                    except asyncio.TimeoutError:
+                        return
+                    if not data:
+                        return
+                    pending.extend(self._feed_parser(parser, data))
+                    continue
+                request = pending.popleft()
+                started = time.monotonic()
+                in_progress = True
+                self.metrics.request_started()
+
+                # Handlers write into the buffer exactly as they would into a socket;
+                # the loop then drains it without blocking other connections.
+                response = _ResponseBuffer()
+
+                served += 1
+                if served >= self.max_keepalive_requests:
+                    request.keep_alive = False
+
+                if not self._allow_request(ip, request.path, admitted=served == 1):
+                    request.keep_alive = False
+                    self._send_response(response, 429, "Too Many Requests", "text/plain", b"Rate limit exceeded\n", request)
+                    await response.flush(writer)
+                    in_progress = False
+                    self._finish_request(ip, request, started, started)
+                    return
+
+                if self.delay_sec > 0:
+                    await asyncio.sleep(self.delay_sec)
+
+                dispatched = time.monotonic()
+                try:
+                    if self._runs_inline(request):
+                        self._process_request(response, request, client_address)
+                    else:
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, self._process_request, response, request, client_address
+                        )
+                except Exception as e:
+                    print(f"Error handling request: {e}")
+                    self.send_response(response, 500, "Internal Server Error", "text/html", request)
+                await response.flush(writer)
+                in_progress = False
+                self._finish_request(ip, request, started, dispatched)
+                if not request.keep_alive:
+                    return
+        except Exception as e:
+            if not isinstance(e, ConnectionError):
+                print(f"Error handling request: {e}")
+        finally:
+            if in_progress:
+                self.metrics.request_abandoned()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _runs_inline(self, request: HTTPRequest) -> bool:
+        # Cheap enough for the event loop: a file whose path is resolved and
+        # whose body (and compressed variant, if one is wanted) is cached.
+        # Anything else may stat, read, compress or walk a directory.
+        if request.method != "GET":
+            return True
+        path = request.path[1:] if request.path.startswith("/") else request.path
+        info = self.path_cache.peek(path)
+        if info is None or info.st is None or info.is_dir or self.cache is None:
+            return False
+        st = info.st
+        if not self.cache.peek(info.full_path, st.st_size, st.st_mtime_ns):
+            return False
+        encoding = self._negotiate_encoding(request, info.content_type, st.st_size)
+        return encoding is None or (
+            st.st_size <= self.compressor.max_size and self.compressor.has_variant(info.full_path, st, encoding)
+        )
+
+    def _feed_parser(self, parser: RequestParser, data: bytes) -> list:
+        parse_started = time.monotonic()
+        requests = parser.feed(data)
+        if requests:
+            # Pipelined requests parsed together share the cost evenly
+            self.metrics.observe("parse", (time.monotonic() - parse_started) / len(requests), len(requests))
+        return requests
+
+    def _finish_request(self, ip: str, request: HTTPRequest, started: float, dispatched: float):
+        # Only counters and an enqueue here; formatting happens elsewhere
+        now = time.monotonic()
+        if request.head_at:
+            self.metrics.observe("fs", max(0.0, request.head_at - dispatched))
+            self.metrics.observe("send", now - request.head_at)
+        self.metrics.request_finished(request.status, request.response_bytes)
+        if self.access_log is not None:
+            self.access_log.log(
+                ip, request.method, request.target, request.version,
+                request.status, request.response_bytes, now - started,
+            )
+
+    def _process_request(self, client_socket, request: HTTPRequest, client_address: Tuple[str, int]):
+        method = request.method
+        path = request.path
+
+        if method != "GET":
+            self.send_response(client_socket, 405, "Method Not Allowed", "text/html", request)
+            return
+
+        if path == METRICS_PATH:
+            self.serve_metrics(client_socket, request)
+            return
+
+        if path.startswith("/"):
+            path = path[1:]
+
+        # Hot paths skip normpath/stat/relpath entirely
+        info = self.path_cache.get(path)
+        if info is None:
+            info = self._resolve_path(path)
+            if info is None:
+                self.send_response(client_socket, 403, "Forbidden", "text/html", request)
+                return
+
+        if info.st is None:
+            self.send_404(client_socket, path, request)
+            return
+
+        params = parse_qs(request.query) if info.is_dir and request.query else {}
+        if self.file_index is not None and params.get("q", [""])[0]:
+            self.serve_search(client_socket, path, info.rel, params["q"][0], request)
+            return
+
+        # count visits per relative path (folders use '' for the root)
+        self._increment_count(info.rel)
+        if info.is_dir and self.archives and "archive" in params:
+            self.serve_archive(client_socket, info, params["archive"][0], request)
+        elif info.is_dir:
+            self.serve_directory(client_socket, info.full_path, path, request, info.st, params)
+        else:
+            self.serve_file(client_socket, info.full_path, request, info)
+
+    def _resolve_path(self, path: str) -> PathInfo | None:
+        # None means the path escapes the served directory
+        full_path = os.path.normpath(os.path.join(self.directory, path))
+        # Whole components only: "/srv/files-old" is not inside "/srv/files"
+        if full_path != self.directory and not full_path.startswith(self._root_prefix):
+            return None
+        rel = os.path.relpath(full_path, self.directory)
+        if rel == ".":
+            rel = ""
+        content_type, _ = mimetypes.guess_type(full_path)
+        content_type = content_type or "application/octet-stream"
+        # The Bloom filter rules out most missing paths without a stat. Its
+        # answer is not cached: that would hide a file created in the next TTL.
+        if self.file_index is not None and not self.file_index.might_exist(rel):
+            return PathInfo(full_path, rel, None, content_type, 0.0)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            st = None
+        return self.path_cache.put(path, full_path, rel, st, content_type)
+
     # Response helpers 
-    def serve_file(self, client_socket, file_path):
+    def serve_file(self, client_socket, file_path, request=None, info: PathInfo | None = None):
         try:
-            with open(file_path, "rb") as f:
-                content = f.read()
+            st = info.st if info is not None else os.stat(file_path)
+            entry = None
+            if self.cache is not None:
+                entry = self.cache.get(file_path, st.st_size, st.st_mtime_ns)
+            if entry is not None:
+                etag, last_modified, content_type = entry.etag, entry.last_modified, entry.content_type
+            else:
+                etag, last_modified = _file_etag(st), _http_date(st.st_mtime)
+                if info is not None:
+                    content_type = info.content_type
+                else:
+                    content_type, _ = mimetypes.guess_type(file_path)
+                    if content_type is None:
+                        content_type = "application/octet-stream"
 
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = "application/octet-stream"
+            encoding = self._negotiate_encoding(request, content_type, st.st_size)
+            if encoding is not None and self._serve_compressed(client_socket, file_path, st, content_type, encoding, request):
+                return
+            # Identity responses of compressible files vary on Accept-Encoding too
+            vary = ["Vary: Accept-Encoding"] if self.compressor is not None and is_compressible(content_type) else []
+            validators = [f"ETag: {etag}", f"Last-Modified: {last_modified}", "Accept-Ranges: bytes"] + vary
+
+            if self._not_modified(request, etag, st.st_mtime):
+                self._send_not_modified(client_socket, validators, request)
+                return
+
+            if entry is not None:
+                # Hit: no open/read and no MIME lookup
+                ranges = self._requested_ranges(request, etag, st.st_mtime, entry.size)
+                if ranges is not None:
+                    self._send_ranges(client_socket, ranges, entry.size, entry.content_type, validators, request, body=entry.body)
+                else:
+                    header = self._build_headers(200, "OK", entry.content_type, entry.size, request, validators)
+                    self._send_vectored(client_socket, [header, entry.body])
+                return
+
+            with open(file_path, "rb") as f:
+                st = os.fstat(f.fileno())
+                size = st.st_size
+                etag, last_modified = _file_etag(st), _http_date(st.st_mtime)
+                validators = [f"ETag: {etag}", f"Last-Modified: {last_modified}", "Accept-Ranges: bytes"] + vary
+                ranges = self._requested_ranges(request, etag, st.st_mtime, size)
+                if ranges is not None:
+                    self._send_ranges(client_socket, ranges, size, content_type, validators, request, file=f)
+                    return
 
-            header = self._build_headers(200, "OK", content_type, len(content))
-            client_socket.sendall(header + content)
-            print(f"✓ Served file: {os.path.basename(file_path)}")
+                header = self._build_headers(200, "OK", content_type, size, request, validators)
+                if self.cache is not None and size <= self.cache.max_object_bytes:
+                    body = f.read(size)
+                    self.cache.put(file_path, body, content_type, size, st.st_mtime_ns, etag, last_modified)
+                    self._send_vectored(client_socket, [header, body])
+                elif size >= self.sendfile_threshold:
+                    # Large files go from the page cache straight to the socket,
+                    # so memory per download stays flat whatever the size.
+                    client_socket.sendall(header)
+                    sent = client_socket.sendfile(f, 0, size)
+                    if sent < size and request is not None:
+                        # File shrank under us: the promised length was not met
+                        request.keep_alive = False
+                else:
+                    self._send_vectored(client_socket, [header, f.read(size)])
         except Exception as e:
             print(f"✗ Error serving file: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            self.send_response(client_socket, 500, "Internal Server Error", "text/html", request)
+
+    def _negotiate_encoding(self, request, content_type: str, size: int) -> str | None:
+        if self.compressor is None or request is None or size < self.compressor.min_size:
+            return None
+        # Ranges always refer to the identity body
+        if "range" in request.headers or not is_compressible(content_type):
+            return None
+        accept_encoding = request.headers.get("accept-encoding")
+        return negotiate(accept_encoding) if accept_encoding else None
+
+    def _serve_compressed(self, client_socket, file_path, st: os.stat_result, content_type: str, encoding: str, request) -> bool:
+        # Returns False when the identity body should be sent instead
+        sidecar = None
+        if st.st_size <= self.compressor.max_size:
+            body = self.compressor.variant(file_path, st, encoding)
+            if body is None:
+                return False
+        else:
+            # Too big to compress per request: only a precompressed sidecar is used
+            sidecar = fresh_sidecar(file_path, st) if encoding == "gzip" else None
+            if sidecar is None:
+                return False
+
+        # Each coding is a different representation, so it gets its own ETag
+        etag = f'{_file_etag(st)[:-1]}-{encoding}"'
+        validators = [f"ETag: {etag}", f"Last-Modified: {_http_date(st.st_mtime)}", "Vary: Accept-Encoding"]
+        if self._not_modified(request, etag, st.st_mtime):
+            self._send_not_modified(client_socket, validators, request)
+            return True
+        validators.append(f"Content-Encoding: {encoding}")
+
+        if sidecar is None:
+            header = self._build_headers(200, "OK", content_type, len(body), request, validators)
+            self._send_vectored(client_socket, [header, body])
+            return True
+        with open(sidecar, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            client_socket.sendall(self._build_headers(200, "OK", content_type, size, request, validators))
+            if client_socket.sendfile(f, 0, size) < size:
+                request.keep_alive = False
+        return True
+
+    def _requested_ranges(self, request, etag: str, mtime: float, size: int):
+        # None means serve the whole file; an empty list means 416
+        if request is None:
+            return None
+        range_header = request.headers.get("range")
+        if range_header is None:
+            return None
+        if_range = request.headers.get("if-range")
+        if if_range is not None:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith("W/"):
+                # If-Range needs a strong match, otherwise the full file is sent
+                if if_range != etag or etag.startswith("W/"):
+                    return None
+            else:
+                try:
+                    since = email.utils.parsedate_to_datetime(if_range).timestamp()
+                except (TypeError, ValueError):
+                    return None
+                if int(mtime) != since:
+                    return None
+        return _parse_ranges(range_header, size)
+
+    def _send_ranges(self, client_socket, ranges, size, content_type, validators, request, body=None, file=None):
+        # Parts come either from a cached body or straight from the open file
+        def send_part(start, end):
+            if body is not None:
+                client_socket.sendall(memoryview(body)[start:end + 1])
+            else:
+                client_socket.sendfile(file, start, end - start + 1)
+
+        if not ranges:
+            header = self._build_headers(
+                416, "Range Not Satisfiable", "text/plain", 0, request, [f"Content-Range: bytes */{size}"]
+            )
+            client_socket.sendall(header)
+            return
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            extra = validators + [f"Content-Range: bytes {start}-{end}/{size}"]
+            header = self._build_headers(206, "Partial Content", content_type, end - start + 1, request, extra)
+            client_socket.sendall(header)
+            send_part(start, end)
+            return
+
+        boundary = secrets.token_hex(12)
+        part_heads = [
+            (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        length = sum(len(h) for h in part_heads) + sum(end - start + 1 for start, end in ranges) + len(closing)
+        header = self._build_headers(
+            206, "Partial Content", f"multipart/byteranges; boundary={boundary}", length, request, validators
+        )
+        client_socket.sendall(header)
+        for part_head, (start, end) in zip(part_heads, ranges):
+            client_socket.sendall(part_head)
+            send_part(start, end)
+        client_socket.sendall(closing)
+
+    def _directory_listing(self, dir_path: str, url_path: str, st: os.stat_result | None = None) -> "_DirectoryListing":
+        if st is None:
+            st = os.stat(dir_path)
+        key = (dir_path, url_path)
+        listing = self._listings.get(key)
+        if listing is not None and listing.mtime_ns == st.st_mtime_ns and listing.ino == st.st_ino:
+            return listing
+
+        # One scandir pass: d_type answers is-dir without a stat per entry
+        with os.scandir(dir_path) as it:
+            entries = sorted((entry.name, entry.is_dir()) for entry in it)
+
+        rel_dir = os.path.relpath(dir_path, self.directory)
+        rel_prefix = "" if rel_dir == "." else rel_dir + os.sep
+
+        html = [
+            "<!DOCTYPE html>",
+            "<html>",
+            "<head>",
+            '<meta charset="utf-8">',
+            f"<title>Directory listing for /{url_path}</title>",
+            *_PAGE_STYLE,
+            "</head>",
+            "<body>",
+            '<div class="container">',
+            f"<h1>📂 Directory listing for /{url_path}</h1>",
+            "<ul>",
+        ]
+
+        if url_path:
+            parent = "/".join(url_path.rstrip("/").split("/")[:-1])
+            html.append(f'<li class="parent"><a href="/{parent}">Parent Directory</a></li>')
+
+        keys = []
+        prefixes = []
+        for entry, is_dir in entries:
+            url_entry = f"{url_path}/{entry}" if url_path else entry
+            keys.append(rel_prefix + entry)
+            if is_dir:
+                prefixes.append(f'<li class="dir"><a href="/{url_entry}/">{entry}/</a> (requests: '.encode("utf-8"))
+            else:
+                prefixes.append(f'<li class="file"><a href="/{url_entry}">{entry}</a> (requests: '.encode("utf-8"))
+
+        tail = [
+            "</ul>",
+            "<footer>",
+            f"<em>Python HTTP File Server - Port {self.port}</em>",
+            "</footer>",
+            "</div>",
+            "</body>",
+            "</html>",
+        ]
+
+        listing = _DirectoryListing(
+            st.st_mtime_ns,
+            st.st_ino,
+            st.st_mtime,
+            ("\n".join(html) + "\n").encode("utf-8"),
+            keys,
+            prefixes,
+            "\n".join(tail).encode("utf-8"),
+            [name for name, _ in entries],
+            [is_dir for _, is_dir in entries],
+        )
+        with self._listings_lock:
+            self._listings.pop(key, None)
+            self._listings[key] = listing
+            while len(self._listings) > LISTING_CACHE_SIZE:
+                del self._listings[next(iter(self._listings))]
+        return listing
+
+    def serve_directory(self, client_socket, dir_path, url_path, request=None, st: os.stat_result | None = None, params=None):
+        try:
+            listing = self._directory_listing(dir_path, url_path, st)
+            try:
+                page = self._listing_page(listing, params or {})
+            except ValueError:
+                self.send_response(client_socket, 400, "Bad Request", "text/html", request)
+                return
+            fmt, sort, order, start, limit, indices, counts, stamp = page
+            entry_stats = None
+            if fmt == "json":
+                # JSON carries sizes and mtimes, which change without the
+                # directory changing: they go into the validator as well
+                if listing.stats is not None:
+                    entry_stats = [listing.stats[i] for i in indices]
+                else:
+                    entry_stats = [self._entry_stat(listing, i) for i in indices]
+                stamp += f"-{hash(tuple(entry_stats)) & 0xffffffff:x}"
+
+            # The page shows live counters, so the validator covers them too.
+            # Counters only grow, which makes their sum change on any hit.
+            content_type = "application/json" if fmt == "json" else "text/html; charset=utf-8"
+            encoding = self._negotiate_encoding(request, content_type, len(listing.head))
+            suffix = f"-{encoding}" if encoding else ""
+            etag = f'W/"{listing.ino:x}-{listing.mtime_ns:x}-{sum(counts):x}{stamp}{suffix}"'
+            validators = [f"ETag: {etag}", f"Last-Modified: {_http_date(listing.mtime)}"]
+            if self.compressor is not None:
+                validators.append("Vary: Accept-Encoding")
+            # Counter changes do not move the directory mtime, so only the
+            # ETag can prove the listing is unchanged.
+            if self._not_modified(request, etag, None):
+                self._send_not_modified(client_socket, validators, request)
+                return
+
+            next_start = start + len(indices)
+            if fmt == "json":
+                parts = self._listing_json(listing, url_path, sort, order, start, limit, indices, counts, entry_stats, next_start)
+            else:
+                parts = self._listing_html(listing, url_path, sort, order, start, limit, indices, counts, next_start)
+            if len(indices) >= self.stream_min_entries:
+                # Big pages go out as they are rendered instead of being joined first
+                if encoding is not None:
+                    parts = compress_stream(parts, encoding, self.compressor.level)
+                    validators.append(f"Content-Encoding: {encoding}")
+                self.send_stream(client_socket, 200, "OK", content_type, parts, request, validators)
+                return
+            content = b"".join(parts)
+            if encoding is not None:
+                # Live counters make every page unique: compressed per request
+                content = compress(content, encoding, self.compressor.level)
+                validators.append(f"Content-Encoding: {encoding}")
+
+            header = self._build_headers(200, "OK", content_type, len(content), request, validators)
+            self._send_vectored(client_socket, [header, content])
+        except Exception as e:
+            print(f"✗ Error serving directory: {e}")
+            self.send_response(client_socket, 500, "Internal Server Error", "text/html", request)
+
+    def _listing_page(self, listing: "_DirectoryListing", params):
+        # Raises ValueError for parameters we cannot honour (answered with 400)
+        def param(name, default):
+            return params.get(name, [default])[0]
+
+        fmt, sort, order = param("format", "html"), param("sort", "name"), param("order", "asc")
+        if fmt not in ("html", "json") or sort not in LISTING_SORTS or order not in ("asc", "desc"):
+            raise ValueError("unsupported listing parameters")
+        limit = int(param("limit", str(self.listing_page_size)))
+        if not 1 <= limit <= LISTING_MAX_LIMIT:
+            raise ValueError("limit out of range")
+        total = len(listing.keys)
+
+        all_counts = None
+        stamp = ""
+        if sort == "name":
+            order_list = range(total) if order == "asc" else range(total - 1, -1, -1)
+        elif sort == "requests":
+            all_counts = self._get_counts(listing.keys)
+            order_list = sorted(range(total), key=lambda i: (all_counts[i], listing.names[i]), reverse=order == "desc")
+        else:
+            order_list, stamp = self._listing_order(listing, sort)
+            stamp = f"-{stamp:x}"
+            if order == "desc":
+                order_list = order_list[::-1]
+
+        cursor = param("cursor", "")
+        if cursor:
+            start = _decode_cursor(cursor, listing.names, sort, order)
+        else:
+            start = int(param("offset", "0"))
+        if start < 0:
+            raise ValueError("negative offset")
+
+        indices = list(order_list[start:start + limit])
+        if all_counts is not None:
+            counts = [all_counts[i] for i in indices]
+        else:
+            # Only the page's counters: cost is bounded by the page size
+            counts = self._get_counts([listing.keys[i] for i in indices])
+        return fmt, sort, order, start, limit, indices, counts, stamp
+
+    def _listing_order(self, listing: "_DirectoryListing", sort: str):
+        # size/mtime orders need a stat per entry; they are reused for the
+        # path cache TTL because file sizes change without touching the
+        # directory's mtime.
+        now = time.monotonic()
+        if listing.stats is None or now - listing.stats_at > max(self.path_cache.ttl, 1.0):
+            listing.stats = [self._entry_stat(listing, i) for i in range(len(listing.keys))]
+            listing.stats_at = now
+            listing.orders = {}
+        order_list = listing.orders.get(sort)
+        if order_list is None:
+            column = 0 if sort == "size" else 1
+            stats = listing.stats
+            order_list = sorted(range(len(stats)), key=lambda i: (stats[i][column], listing.names[i]))
+            listing.orders[sort] = order_list
+        return order_list, int(listing.stats_at * 1000)
 
-    def serve_directory(self, client_socket, dir_path, url_path):
+    def _entry_stat(self, listing: "_DirectoryListing", i: int) -> Tuple[int, float]:
         try:
-            entries = os.listdir(dir_path)
-            entries.sort()
+            st = os.stat(os.path.join(self.directory, listing.keys[i]))
+            return (0 if listing.dirs[i] else st.st_size, st.st_mtime)
+        except OSError:
+            return (0, 0.0)
+
+    def _listing_html(self, listing, url_path, sort, order, start, limit, indices, counts, next_start):
+        yield listing.head
+        for i, count in zip(indices, counts):
+            yield listing.prefixes[i]
+            yield str(count).encode()
+            yield b")</li>\n"
+        total = len(listing.keys)
+        if start > 0 or next_start < total:
+            yield self._listing_nav(url_path, sort, order, start, limit, len(indices), total, listing, indices)
+        yield listing.tail
 
-            html = [
+    def _listing_json(self, listing, url_path, sort, order, start, limit, indices, counts, entry_stats, next_start):
+        # Rendered entry by entry so a long page can be streamed; the joined
+        # pieces are exactly json.dumps() of the whole document.
+        total = len(listing.keys)
+        has_more = next_start < total
+        head = {"path": f"/{url_path}", "total": total, "offset": start, "limit": limit, "sort": sort, "order": order}
+        tail = {
+            "next_offset": next_start if has_more else None,
+            "next_cursor": _encode_cursor(listing.names[indices[-1]] if sort == "name" else None, next_start) if has_more else None,
+        }
+        yield json.dumps(head, ensure_ascii=False)[:-1].encode("utf-8") + b', "entries": ['
+        separator = b""
+        for i, count, (size, mtime) in zip(indices, counts, entry_stats):
+            name, is_dir = listing.names[i], listing.dirs[i]
+            href = quote("/" + (f"{url_path.rstrip('/')}/{name}" if url_path else name) + ("/" if is_dir else ""))
+            entry = {
+                "name": name,
+                "type": "dir" if is_dir else "file",
+                "href": href,
+                "size": None if is_dir else size,
+                "mtime": mtime,
+                "requests": count,
+            }
+            yield separator + json.dumps(entry, ensure_ascii=False).encode("utf-8")
+            separator = b", "
+        yield b"], " + json.dumps(tail)[1:].encode("utf-8")
+
+    def _listing_nav(self, url_path, sort, order, start, limit, shown, total, listing, indices) -> bytes:
+        def link(query):
+            return quote(f"/{url_path}") + "?" + urlencode(query)
+
+        base = {}
+        if sort != "name":
+            base["sort"] = sort
+        if order != "asc":
+            base["order"] = order
+        if limit != self.listing_page_size:
+            base["limit"] = limit
+        items = [f"<li>Showing {start + 1 if shown else start}-{start + shown} of {total}"]
+        if start > 0:
+            items.append(f' · <a href="{html.escape(link({**base, "offset": max(0, start - limit)}))}">« Previous</a>')
+        if start + shown < total:
+            cursor = _encode_cursor(listing.names[indices[-1]] if sort == "name" else None, start + shown)
+            items.append(f' · <a href="{html.escape(link({**base, "cursor": cursor}))}">Next »</a>')
+        items.append("</li>\n")
+        return "".join(items).encode("utf-8")
+
+    def serve_archive(self, client_socket, info: PathInfo, fmt: str, request=None):
+        if fmt not in ARCHIVE_FORMATS:
+            self.send_response(client_socket, 400, "Bad Request", "text/html", request)
+            return
+        content_type, extension = ARCHIVE_FORMATS[fmt]
+        name = os.path.basename(info.full_path) or "root"
+        # Built while it is sent: neither the archive nor a file in it is held in memory
+        body = tar_stream(info.full_path, name)
+        if fmt == "tgz":
+            body = compress_stream(body, "gzip", self.compressor.level if self.compressor is not None else 6)
+        disposition = f"Content-Disposition: attachment; filename*=UTF-8''{quote(name + extension)}"
+        self.send_stream(client_socket, 200, "OK", content_type, body, request, [disposition])
+
+    def serve_search(self, client_socket, url_path: str, rel_dir: str, term: str, request=None):
+        try:
+            results = self.file_index.search(term, rel_dir, SEARCH_LIMIT)
+            counts = self._get_counts([rel for rel, _ in results])
+            # Unlike listings the page echoes user input, so everything is escaped
+            shown = html.escape(term)
+            page = [
                 "<!DOCTYPE html>",
                 "<html>",
                 "<head>",
                 '<meta charset="utf-8">',
-                f"<title>Directory listing for /{url_path}</title>",
-                "<style>",
-                "body { font-family: Arial, sans-serif; margin: 40px; background: #f5f5f5; }",
-                ".container { background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }",
-                "h1 { color: #333; margin-top: 0; }",
-                "ul { list-style: none; padding: 0; }",
-                "li { padding: 12px; border-bottom: 1px solid #eee; transition: background 0.2s; }",
-                "li:hover { background: #f9f9f9; }",
-                "a { text-decoration: none; color: #0066cc; }",
-                "a:hover { text-decoration: underline; }",
-                ".dir { font-weight: bold; color: #d97706; }",
-                '.dir:before { content: "📁 "; }',
-                '.file:before { content: "📄 "; }',
-                '.parent:before { content: "⬆️ "; }',
-                "footer { margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; color: #666; font-size: 14px; }",
-                "</style>",
+                f"<title>Search for {shown} in /{html.escape(url_path)}</title>",
+                *_PAGE_STYLE,
                 "</head>",
                 "<body>",
                 '<div class="container">',
-                f"<h1>📂 Directory listing for /{url_path}</h1>",
+                f"<h1>🔍 {len(results)} results for \"{shown}\" in /{html.escape(url_path)}</h1>",
                 "<ul>",
+                f'<li class="parent"><a href="/{html.escape(url_path)}">Back to listing</a></li>',
             ]
-
-            if url_path:
-                parent = "/".join(url_path.rstrip("/").split("/")[:-1])
-                html.append(f'<li class="parent"><a href="/{parent}">Parent Directory</a></li>')
-
-            for entry in entries:
-                entry_path = os.path.join(dir_path, entry)
-                url_entry = f"{url_path}/{entry}" if url_path else entry
-                rel = os.path.relpath(entry_path, self.directory)
-                if os.path.isdir(entry_path):
-                    dcount = self._get_count(rel)
-                    html.append(f'<li class="dir"><a href="/{url_entry}/">{entry}/</a> (requests: {dcount})</li>')
+            for (rel, is_dir), count in zip(results, counts):
+                href = html.escape(quote(rel), quote=True)
+                if is_dir:
+                    page.append(f'<li class="dir"><a href="/{href}/">{html.escape(rel)}/</a> (requests: {count})</li>')
                 else:
-                    fcount = self._get_count(rel)
-                    html.append(f'<li class="file"><a href="/{url_entry}">{entry}</a> (requests: {fcount})</li>')
-
-            html.extend([
+                    page.append(f'<li class="file"><a href="/{href}">{html.escape(rel)}</a> (requests: {count})</li>')
+            if len(results) == SEARCH_LIMIT:
+                page.append(f"<li>Only the first {SEARCH_LIMIT} matches are shown</li>")
+            page += [
                 "</ul>",
                 "<footer>",
                 f"<em>Python HTTP File Server - Port {self.port}</em>",
@@ -295,17 +1607,72 @@ class HTTPServerLab2:
                 "</div>",
                 "</body>",
                 "</html>",
-            ])
-
-            content = "\n".join(html).encode("utf-8")
-            header = self._build_headers(200, "OK", "text/html; charset=utf-8", len(content))
-            client_socket.sendall(header + content)
-            print(f"✓ Served directory: {os.path.basename(dir_path) or 'root'}")
+            ]
+            content = "\n".join(page).encode("utf-8")
+            header = self._build_headers(200, "OK", "text/html; charset=utf-8", len(content), request)
+            self._send_vectored(client_socket, [header, content])
         except Exception as e:
-            print(f"✗ Error serving directory: {e}")
-            self.send_response(client_socket, 500, "Internal Server Error", "text/html")
+            print(f"✗ Error serving search: {e}")
+            self.send_response(client_socket, 500, "Internal Server Error", "text/html", request)
+
+    def serve_metrics(self, client_socket, request=None):
+        report = self._metrics_report()
+        if self._count_batcher is not None:
+            # Any worker may get the scrape, so every one answers with the
+            # sum over all workers instead of its own numbers
+            report = self._shared_counts.merged_metrics(self._worker_slot, os.getpid(), report)
+        body = self.metrics.render(report["extra"], report["snapshot"]).encode("utf-8")
+        header = self._build_headers(200, "OK", "text/plain; version=0.0.4; charset=utf-8", len(body), request)
+        self._send_vectored(client_socket, [header, body])
+
+    def _metrics_report(self) -> Dict[str, object]:
+        # Gauges and totals owned by other components are read at scrape time
+        pool = self.pool.stats() if self.pool is not None else {}
+        queue_wait = self._queue_wait.snapshot()
+        service_time = self._service_time.snapshot()
+        extra = [
+            ("http_pool_queue_depth", "gauge", "Accepted connections waiting for a worker.", self._queued),
+            ("http_pool_workers", "gauge", "Worker threads currently in the pool.", pool.get("workers", 0)),
+            ("http_pool_busy_workers", "gauge", "Pool threads currently running a connection.", pool.get("busy", 0)),
+            ("http_pool_grown_total", "counter", "Threads added by the pool controller.", pool.get("grown", 0)),
+            ("http_pool_shrunk_total", "counter", "Idle threads retired by the pool controller.", pool.get("shrunk", 0)),
+            ("http_queue_wait_seconds_sum", "counter", "Time admitted connections waited for a pool thread.", round(queue_wait["avg_sec"] * queue_wait["count"], 6)),
+            ("http_queue_wait_seconds_count", "counter", "Admitted connections that reached a pool thread.", queue_wait["count"]),
+            ("http_connection_service_seconds_sum", "counter", "Time pool threads spent on connections.", round(service_time["avg_sec"] * service_time["count"], 6)),
+            ("http_connection_service_seconds_count", "counter", "Connections finished by pool threads.", service_time["count"]),
+            ("http_admission_shed_total", "counter", "Connections refused with 503 because the queue was full.", self._shed),
+            ("http_rate_limit_rejections_total", "counter", "Requests refused with 429 by the rate limiter.", self.rate_limiter.rejected),
+        ]
+        if self.cache is not None:
+            cache = self.cache.stats()
+            extra += [
+                ("content_cache_hits_total", "counter", "Content cache hits.", cache["hits"]),
+                ("content_cache_misses_total", "counter", "Content cache misses.", cache["misses"]),
+                ("content_cache_evictions_total", "counter", "Entries evicted to stay within the byte budget.", cache["evictions"]),
+                ("content_cache_invalidations_total", "counter", "Entries dropped because the file changed.", cache["invalidations"]),
+                ("content_cache_entries", "gauge", "Files held in the content cache.", cache["entries"]),
+                ("content_cache_bytes", "gauge", "Body bytes held in the content cache.", cache["bytes"]),
+            ]
+        if self.compressor is not None:
+            compression = self.compressor.stats()
+            extra += [
+                ("compression_variant_hits_total", "counter", "Compressed responses served from the variant cache.", compression["hits"]),
+                ("compression_variant_misses_total", "counter", "Compressed variants built from a sidecar or by compressing.", compression["misses"]),
+            ]
+        if self.access_log is not None:
+            extra.append(("access_log_dropped_total", "counter", "Access log records dropped on overflow.", self.access_log.dropped))
+        return {"snapshot": self.metrics.snapshot(), "extra": extra}
 
-    def send_404(self, client_socket, path):
+    def _publish_metrics_forever(self):
+        while True:
+            time.sleep(METRICS_SYNC_INTERVAL)
+            try:
+                self._shared_counts.publish_metrics(self._worker_slot, os.getpid(), self._metrics_report())
+            except (OSError, EOFError):
+                # Coordinator gone (shutting down)
+                return
+
+    def send_404(self, client_socket, path, request=None):
         content = f"""<!DOCTYPE html>
 <html>
 <head>
@@ -330,11 +1697,10 @@ class HTTPServerLab2:
 </body>
 </html>"""
         content_bytes = content.encode("utf-8")
-        header = self._build_headers(404, "Not Found", "text/html; charset=utf-8", len(content_bytes))
-        client_socket.sendall(header + content_bytes)
-        print(f"✗ 404 Not Found: {path}")
+        header = self._build_headers(404, "Not Found", "text/html; charset=utf-8", len(content_bytes), request)
+        self._send_vectored(client_socket, [header, content_bytes])
 
-    def send_response(self, client_socket, status_code, status_text, content_type):
+    def send_response(self, client_socket, status_code, status_text, content_type, request=None):
         content = f"""<!DOCTYPE html>
 <html>
 <head>
@@ -345,25 +1711,203 @@ class HTTPServerLab2:
 </body>
 </html>"""
         content_bytes = content.encode("utf-8")
-        header = self._build_headers(status_code, status_text, f"{content_type}; charset=utf-8", len(content_bytes))
-        client_socket.sendall(header + content_bytes)
-
-    def _send_response(self, client_socket, status_code, status_text, content_type, body_bytes):
-        header = self._build_headers(status_code, status_text, content_type, len(body_bytes))
-        client_socket.sendall(header + body_bytes)
-
-    def _build_headers(self, code: int, text: str, content_type: str, content_length: int) -> bytes:
-        response_headers = [
-            f"HTTP/1.1 {code} {text}",
-            f"Content-Type: {content_type}",
-            f"Content-Length: {content_length}",
-            "Connection: close",
-            "",
-            "",
-        ]
+        header = self._build_headers(status_code, status_text, f"{content_type}; charset=utf-8", len(content_bytes), request)
+        self._send_vectored(client_socket, [header, content_bytes])
+
+    def _send_response(self, client_socket, status_code, status_text, content_type, body_bytes, request=None, extra_headers=None):
+        header = self._build_headers(status_code, status_text, content_type, len(body_bytes), request, extra_headers)
+        self._send_vectored(client_socket, [header, body_bytes])
+
+    def send_stream(self, client_socket, code, text, content_type, chunks, request=None, extra_headers=None):
+        """Send a body produced piece by piece by an iterable of bytes.
+
+        HTTP/1.1 clients get ``Transfer-Encoding: chunked`` and keep their
+        connection; HTTP/1.0 clients read until the connection is closed.
+        """
+        chunked = request is not None and request.version == "HTTP/1.1"
+        if request is not None and not chunked:
+            request.keep_alive = False
+        headers = list(extra_headers or [])
+        if chunked:
+            headers.append("Transfer-Encoding: chunked")
+        header = self._build_headers(code, text, content_type, None, request, headers)
+        body = self._stream_body(chunks, request, chunked)
+        if isinstance(client_socket, _ResponseBuffer):
+            # The event loop pulls the pieces as the client takes them
+            client_socket.sendall(header)
+            client_socket.stream(body)
+            return
+        client_socket.sendall(header)
+        for piece in body:
+            client_socket.sendall(piece)
+
+    def _stream_body(self, chunks, request, chunked: bool):
+        try:
+            for piece in _coalesce(chunks, STREAM_CHUNK_SIZE):
+                if request is not None:
+                    request.response_bytes += len(piece)
+                yield b"%x\r\n%s\r\n" % (len(piece), piece) if chunked else piece
+        except Exception as e:
+            # The head is already out, so no error page is possible. Closing
+            # without the last chunk tells the client the body is incomplete.
+            print(f"✗ Error streaming response: {e}")
+            if request is not None:
+                request.keep_alive = False
+            return
+        if chunked:
+            yield b"0\r\n\r\n"
+
+    def _send_vectored(self, client_socket, buffers):
+        # Scatter-gather write: header and body leave in one sendmsg call
+        # without first being concatenated into a new buffer.
+        views = [memoryview(b) for b in buffers if b]
+        while views:
+            sent = client_socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if sent:
+                views[0] = views[0][sent:]
+
+    def _not_modified(self, request, etag: str, mtime: float | None) -> bool:
+        if request is None:
+            return False
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match wins over If-Modified-Since; GET uses weak comparison
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or mtime is None:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return int(mtime) <= since
+
+    def _send_not_modified(self, client_socket, validators, request=None):
+        header = self._build_headers(304, "Not Modified", None, None, request, validators)
+        client_socket.sendall(header)
+
+    def _build_headers(
+        self,
+        code: int,
+        text: str,
+        content_type: str | None,
+        content_length: int | None,
+        request=None,
+        extra_headers=None,
+    ) -> bytes:
+        # A server error may leave the byte stream in an unknown state, so the
+        # connection is only reused for responses we fully control.
+        if request is not None:
+            request.status = code
+            request.response_bytes = content_length or 0
+            request.head_at = time.monotonic()
+            if code >= 500:
+                request.keep_alive = False
+        response_headers = [f"HTTP/1.1 {code} {text}"]
+        if content_type is not None:
+            response_headers.append(f"Content-Type: {content_type}")
+        if content_length is not None:
+            response_headers.append(f"Content-Length: {content_length}")
+        if extra_headers:
+            response_headers.extend(extra_headers)
+        if request is not None and request.keep_alive:
+            response_headers.append("Connection: keep-alive")
+            response_headers.append(f"Keep-Alive: timeout={int(self.keepalive_timeout)}, max={self.max_keepalive_requests}")
+        else:
+            response_headers.append("Connection: close")
+        response_headers.extend(["", ""])
         return "\r\n".join(response_headers).encode("utf-8")
 
 
+def _coalesce(chunks, size: int):
+    # Generators yield tiny pieces (one listing line, one tar header);
+    # merging them keeps writes and chunk headers few.
+    pending = []
+    pending_bytes = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_bytes += len(chunk)
+        if pending_bytes >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_bytes = 0
+    if pending_bytes:
+        yield b"".join(pending)
+
+
+def _encode_cursor(after_name: str | None, offset: int) -> str:
+    # Name order resumes after the last name shown, so entries added or
+    # removed earlier in the directory do not shift the next page.
+    token = f"n:{after_name}" if after_name is not None else f"o:{offset}"
+    return base64.urlsafe_b64encode(token.encode("utf-8", "surrogateescape")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, names, sort: str, order: str) -> int:
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8", "surrogateescape")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("bad cursor") from e
+    kind, _, value = token.partition(":")
+    if kind == "o":
+        return int(value)
+    # A name cursor is a position in name order; any other sort would
+    # silently skip or repeat entries
+    if kind != "n" or sort != "name":
+        raise ValueError("bad cursor")
+    if order == "asc":
+        return bisect.bisect_right(names, value)
+    # Descending: positions count from the end of the name-sorted list
+    return len(names) - bisect.bisect_left(names, value)
+
+
+def _file_etag(st: os.stat_result) -> str:
+    # Derived from metadata only: no hashing of the content on the hot path
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _http_date(timestamp: float) -> str:
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def _parse_ranges(header: str, size: int):
+    # Returns None for a header we do not understand (the Range is then
+    # ignored), otherwise the satisfiable (start, end) pairs, inclusive.
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    specs = spec.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for item in specs:
+        first, dash, last = item.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                # Suffix range: the last N bytes
+                suffix = int(last)
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python server_lab2.py <directory> [port]")
@@ -374,10 +1918,39 @@ def main():
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
 
     workers = int(os.environ.get("WORKERS", "32"))
+    queue_size = int(os.environ.get("QUEUE_SIZE", "128"))
+    min_workers = int(os.environ.get("MIN_WORKERS", "8"))
+    pool_grow_wait = float(os.environ.get("POOL_GROW_WAIT", "0.05"))
+    pool_cooldown = float(os.environ.get("POOL_COOLDOWN", "30"))
     delay = float(os.environ.get("DELAY", "1.0"))
     counter_mode = os.environ.get("COUNTER_MODE", "locked")
     rate_limit = int(os.environ.get("RATE_LIMIT", "6"))
     rate_window = float(os.environ.get("RATE_WINDOW", "1.0"))
+    rate_rules = os.environ.get("RATE_RULES", "")
+    engine = os.environ.get("ENGINE", "threads")
+    keepalive_timeout = float(os.environ.get("KEEPALIVE_TIMEOUT", "5.0"))
+    max_keepalive_requests = int(os.environ.get("KEEPALIVE_MAX", "100"))
+    sendfile_threshold = int(os.environ.get("SENDFILE_THRESHOLD", str(64 * 1024)))
+    processes = int(os.environ.get("PROCESSES", "1"))
+    reuse_port = os.environ.get("REUSE_PORT", "0") == "1"
+    cache_bytes = int(os.environ.get("CACHE_BYTES", str(64 * 1024 * 1024)))
+    cache_max_object = int(os.environ.get("CACHE_MAX_OBJECT", str(1024 * 1024)))
+    access_log = os.environ.get("ACCESS_LOG", "common")
+    access_log_sample = float(os.environ.get("ACCESS_LOG_SAMPLE", "1.0"))
+    access_log_queue = int(os.environ.get("ACCESS_LOG_QUEUE", "65536"))
+    compress_responses = os.environ.get("COMPRESS", "1") == "1"
+    compress_level = int(os.environ.get("COMPRESS_LEVEL", "6"))
+    compress_min_size = int(os.environ.get("COMPRESS_MIN_SIZE", "256"))
+    compress_cache_bytes = int(os.environ.get("COMPRESS_CACHE_BYTES", str(16 * 1024 * 1024)))
+    path_cache_ttl = float(os.environ.get("PATH_CACHE_TTL", "1.0"))
+    path_cache_size = int(os.environ.get("PATH_CACHE_SIZE", "4096"))
+    file_index = os.environ.get("FILE_INDEX", "1") == "1"
+    file_index_poll = float(os.environ.get("FILE_INDEX_POLL", "5.0"))
+    listing_page_size = int(os.environ.get("LISTING_PAGE_SIZE", "1000"))
+    stream_min_entries = int(os.environ.get("STREAM_MIN_ENTRIES", "2000"))
+    archives = os.environ.get("ARCHIVES", "1") == "1"
+    counts_file = os.environ.get("COUNTS_FILE", "")
+    counts_flush_interval = float(os.environ.get("COUNTS_FLUSH_INTERVAL", "1.0"))
 
     try:
         server = HTTPServerLab2(
@@ -385,10 +1958,39 @@ def main():
             port=port,
             auto_port=True,
             workers=workers,
+            queue_size=queue_size,
+            min_workers=min_workers,
+            pool_grow_wait=pool_grow_wait,
+            pool_cooldown=pool_cooldown,
             delay_sec=delay,
             counter_mode=counter_mode,
             rate_limit=rate_limit,
             rate_window=rate_window,
+            rate_rules=rate_rules,
+            engine=engine,
+            keepalive_timeout=keepalive_timeout,
+            max_keepalive_requests=max_keepalive_requests,
+            sendfile_threshold=sendfile_threshold,
+            processes=processes,
+            reuse_port=reuse_port,
+            cache_bytes=cache_bytes,
+            cache_max_object=cache_max_object,
+            access_log=access_log,
+            access_log_sample=access_log_sample,
+            access_log_queue=access_log_queue,
+            compress_responses=compress_responses,
+            compress_level=compress_level,
+            compress_min_size=compress_min_size,
+            compress_cache_bytes=compress_cache_bytes,
+            counts_file=counts_file,
+            counts_flush_interval=counts_flush_interval,
+            path_cache_ttl=path_cache_ttl,
+            path_cache_size=path_cache_size,
+            file_index=file_index,
+            file_index_poll=file_index_poll,
+            listing_page_size=listing_page_size,
+            stream_min_entries=stream_min_entries,
+            archives=archives,
         )
         server.start()
     except Exception as e:
@@ -0,0 +1,196 @@
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List
+
+_current = threading.local()
+
+
+def worker_slot() -> int | None:
+    """Slot of the calling pool thread, None outside a pool.
+
+    Slots are small integers reused as threads retire and are replaced, so
+    per-thread state keyed by slot stays bounded by ``max_workers`` however
+    often the pool resizes.
+    """
+    return getattr(_current, "slot", None)
+
+
+class ElasticPool:
+    """Thread pool that sizes itself between ``min_workers`` and ``max_workers``.
+
+    A controller thread samples the pool every ``interval`` seconds and
+    grows it when the oldest queued task has waited longer than
+    ``grow_wait`` or the smoothed share of busy threads reaches
+    ``grow_utilization``. Each step adds a thread per queued task, and at
+    least half the current size, so a burst is absorbed in a tick or two
+    instead of one thread at a time.
+
+    Threads that stayed idle for a whole ``cooldown`` window after the last
+    resize are retired, down to ``min_workers``. The window restarts on
+    every resize, so the pool does not flap between bursts. Resizes are
+    kept with their reason in ``stats()``.
+    """
+
+    def __init__(
+        self,
+        min_workers: int = 8,
+        max_workers: int = 32,
+        grow_wait: float = 0.05,
+        grow_utilization: float = 0.8,
+        cooldown: float = 30.0,
+        interval: float = 0.05,
+        name: str = "http-worker",
+    ):
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.grow_wait = grow_wait
+        self.grow_utilization = grow_utilization
+        self.cooldown = cooldown
+        self.interval = interval
+        self.name = name
+
+        self._tasks: Deque = deque()
+        self._cond = threading.Condition()
+        self._threads = set()
+        self._workers = 0
+        self._busy = 0
+        self._retire = 0
+        # Fewest idle threads seen since the window started: that many were never needed
+        self._min_idle = 0
+        self._window_start = 0.0
+        self._utilization = 0.0
+        self._stopped = False
+        self._controller: threading.Thread | None = None
+        # Slots given back by retired threads; new threads take the lowest
+        self._free_slots: List[int] = []
+        self._next_slot = 0
+
+        self.peak = 0
+        self.grown = 0
+        self.shrunk = 0
+        self.decisions: Deque[Dict[str, object]] = deque(maxlen=20)
+
+    def start(self):
+        with self._cond:
+            self._spawn(self.min_workers)
+            self._window_start = time.monotonic()
+            self._min_idle = self._workers
+        self._controller = threading.Thread(target=self._control_forever, name=f"{self.name}-scaler", daemon=True)
+        self._controller.start()
+
+    def submit(self, fn, *args):
+        with self._cond:
+            self._tasks.append((time.monotonic(), fn, args))
+            self._cond.notify()
+
+    def shutdown(self):
+        # Queued tasks still run; then every thread leaves
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join()
+
+    def _spawn(self, count: int):
+        # Caller holds the condition
+        for _ in range(count):
+            if self._free_slots:
+                slot = heapq.heappop(self._free_slots)
+            else:
+                slot = self._next_slot
+                self._next_slot += 1
+            thread = threading.Thread(target=self._work, args=(slot,), name=f"{self.name}-{slot}", daemon=True)
+            self._threads.add(thread)
+            self._workers += 1
+            thread.start()
+        self.peak = max(self.peak, self._workers)
+
+    def _work(self, slot: int):
+        me = threading.current_thread()
+        _current.slot = slot
+        while True:
+            with self._cond:
+                while not self._tasks and not self._stopped and not self._retire:
+                    self._cond.wait()
+                if not self._tasks and (self._stopped or self._retire):
+                    if self._retire:
+                        self._retire -= 1
+                    self._workers -= 1
+                    self._threads.discard(me)
+                    # Free only now: this thread runs nothing more under it
+                    heapq.heappush(self._free_slots, slot)
+                    return
+                _, fn, args = self._tasks.popleft()
+                self._busy += 1
+                idle = self._workers - self._busy
+                if idle < self._min_idle:
+                    self._min_idle = idle
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"✗ Error in worker: {e}")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+
+    def _control_forever(self):
+        while True:
+            time.sleep(self.interval)
+            with self._cond:
+                if self._stopped:
+                    return
+                self._control(time.monotonic())
+
+    def _control(self, now: float):
+        # Caller holds the condition
+        live = self._workers - self._retire
+        sample = self._busy / live if live else 1.0
+        self._utilization = 0.7 * self._utilization + 0.3 * sample
+        oldest_wait = now - self._tasks[0][0] if self._tasks else 0.0
+
+        if live < self.max_workers:
+            reason = None
+            if oldest_wait > self.grow_wait:
+                reason = f"queue wait {oldest_wait * 1000:.0f}ms > {self.grow_wait * 1000:.0f}ms"
+            elif self._utilization >= self.grow_utilization:
+                reason = f"utilization {self._utilization:.0%} >= {self.grow_utilization:.0%}"
+            if reason is not None:
+                add = min(self.max_workers - live, max(1, live // 2, len(self._tasks)))
+                self._spawn(add)
+                self.grown += add
+                self._resized(now, "grow", live, live + add, reason)
+                return
+
+        if now - self._window_start >= self.cooldown:
+            spare = min(self._min_idle, live - self.min_workers)
+            if spare > 0:
+                self._retire += spare
+                self._cond.notify_all()
+                self.shrunk += spare
+                self._resized(now, "shrink", live, live - spare, f"{spare} threads idle for {self.cooldown:g}s")
+            else:
+                self._window_start = now
+                self._min_idle = live - self._busy
+
+    def _resized(self, now: float, action: str, before: int, after: int, reason: str):
+        self.decisions.append({"at": time.time(), "action": action, "from": before, "to": after, "reason": reason})
+        self._window_start = now
+        self._min_idle = after - self._busy
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "workers": self._workers - self._retire,
+                "busy": self._busy,
+                "queued": len(self._tasks),
+                "min": self.min_workers,
+                "max": self.max_workers,
+                "peak": self.peak,
+                "utilization": round(self._utilization, 3),
+                "grown": self.grown,
+                "shrunk": self.shrunk,
+                "decisions": list(self.decisions),
+            }